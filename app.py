@@ -1,5 +1,6 @@
 import os
 import uuid
+import pickle
 import urllib.parse
 import socket
 import hmac
@@ -7,16 +8,31 @@ import secrets
 import json
 import datetime
 import base64
+import bisect
+import hashlib
+import heapq
 import mimetypes
 import threading
 import time
+import re
+import unicodedata
+import http.cookiejar
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from types import SimpleNamespace
 from zoneinfo import ZoneInfo
+import click
 import requests
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, abort
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, abort, g, has_request_context
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.ext.automap import automap_base
+from sqlalchemy.orm import aliased, defer
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import func, or_, text, inspect
+import sqlalchemy
+from sqlalchemy import MetaData, and_, bindparam, case, cast, event, func, literal, null, or_, text, inspect
+from sqlalchemy.engine import Engine
 from dotenv import load_dotenv
 from werkzeug.utils import secure_filename
 from azure.storage.blob import BlobServiceClient
@@ -32,6 +48,8 @@ if len(secret_key) < 32:
     raise RuntimeError("SECRET_KEY moet minimaal 32 tekens lang zijn.")
 app.secret_key = secret_key
 debug_mode = os.environ.get('FLASK_DEBUG', '0') == '1'
+# Queries per request tellen en als X-Query-Count meesturen; alleen voor ontwikkeling.
+QUERY_COUNT_HEADER = os.environ.get('QUERY_COUNT_HEADER', '1' if debug_mode else '0') == '1'
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 app.config['SESSION_COOKIE_SECURE'] = os.environ.get('SESSION_COOKIE_SECURE', '0' if debug_mode else '1') == '1'
@@ -53,6 +71,24 @@ PRINT_SERVICE_API_KEY = os.environ.get('PRINT_SERVICE_API_KEY')
 PRINT_SERVICE_REQUIRE_API_KEY = os.environ.get('PRINT_SERVICE_REQUIRE_API_KEY', '1') == '1'
 PRINT_CONNECT_TIMEOUT = float(os.environ.get('PRINT_CONNECT_TIMEOUT', '3'))
 PRINT_REQUEST_TIMEOUT = float(os.environ.get('PRINT_REQUEST_TIMEOUT', '10'))
+PRINT_DISPATCH_CONCURRENCY = max(1, int(os.environ.get('PRINT_DISPATCH_CONCURRENCY', '4')))
+PRINT_DISPATCH_MODE = os.environ.get('PRINT_DISPATCH_MODE', 'inline').strip().lower()
+PRINT_WORKER_BATCH_SIZE = max(1, int(os.environ.get('PRINT_WORKER_BATCH_SIZE', '20')))
+PRINT_WORKER_POLL_INTERVAL = float(os.environ.get('PRINT_WORKER_POLL_INTERVAL', '2'))
+PRINT_CLAIM_TIMEOUT = int(os.environ.get('PRINT_CLAIM_TIMEOUT', '300'))
+PRINT_PRECOMPUTE_PAYLOAD = os.environ.get('PRINT_PRECOMPUTE_PAYLOAD', '1') == '1'
+PRINT_BATCH_MODE = os.environ.get('PRINT_BATCH_MODE', 'auto').strip().lower()
+PRINT_BATCH_SIZE = max(1, int(os.environ.get('PRINT_BATCH_SIZE', '10')))
+PRINT_HTTP_POOL_SIZE = max(1, int(os.environ.get('PRINT_HTTP_POOL_SIZE', '10')))
+PRINT_HTTP_RETRIES = max(0, int(os.environ.get('PRINT_HTTP_RETRIES', '2')))
+PRINT_HTTP_BACKOFF = float(os.environ.get('PRINT_HTTP_BACKOFF', '0.3'))
+PRINT_HEALTH_CACHE_TTL = float(os.environ.get('PRINT_HEALTH_CACHE_TTL', '30'))
+PRINT_IMAGE_CACHE_MAX_ITEMS = max(1, int(os.environ.get('PRINT_IMAGE_CACHE_MAX_ITEMS', '256')))
+PRINT_IMAGE_CACHE_MAX_DISK_ITEMS = int(os.environ.get('PRINT_IMAGE_CACHE_MAX_DISK_ITEMS', '2000'))
+PRINT_IMAGE_CACHE_TTL = float(os.environ.get('PRINT_IMAGE_CACHE_TTL', '3600'))
+# Standaard geen schijfcache: de bestanden gaan als vertrouwde bytes naar de
+# printer. Een ingesteld pad moet een eigen map (0700, eigen uid) zijn.
+PRINT_IMAGE_CACHE_DIR = os.environ.get('PRINT_IMAGE_CACHE_DIR', '')
 KANBAN_SCAN_BASE_URL = os.environ.get('KANBAN_SCAN_BASE_URL', default_scan_base_url)
 APP_VERSION = os.environ.get('APP_VERSION', 'dev')
 APP_BUILD_DATETIME = os.environ.get(
@@ -61,6 +97,17 @@ APP_BUILD_DATETIME = os.environ.get(
 )
 APP_TIMEZONE = os.environ.get('APP_TIMEZONE', 'Europe/Amsterdam')
 DEFAULT_LAYOUT_REFRESH_SECONDS = 300
+TENANT_CONTEXT_TTL = float(os.environ.get('TENANT_CONTEXT_TTL', '30'))
+SCANLIJST_PAGE_SIZE = max(1, int(os.environ.get('SCANLIJST_PAGE_SIZE', '100')))
+SCANLIJST_POLL_INTERVAL = max(2, int(os.environ.get('SCANLIJST_POLL_INTERVAL', '10')))
+SCANLIJST_DELTA_OVERLAP = max(0, int(os.environ.get('SCANLIJST_DELTA_OVERLAP', '60')))
+CATALOGUS_INDEX_TTL = float(os.environ.get('CATALOGUS_INDEX_TTL', '300'))
+CATALOGUS_ZOEK_PAGE_SIZE = 25
+CATALOGUS_EAN_MISS_TTL = float(os.environ.get('CATALOGUS_EAN_MISS_TTL', '30'))
+CATALOGUS_EAN_MISS_MAX_ITEMS = 1000
+# Standaard uit: een pickle laden is code uitvoeren, dus alleen op een pad dat
+# de beheerder bewust kiest (bij voorkeur binnen de appmap).
+SCHEMA_CACHE_PATH = os.environ.get('SCHEMA_CACHE_PATH', '')
 
 if not all([db_server, db_name, db_user, db_pass]):
     print("WAARSCHUWING: Database configuratie ontbreekt!")
@@ -71,6 +118,10 @@ encoded_pass = urllib.parse.quote_plus(db_pass) if db_pass else ''
 driver = 'ODBC+Driver+18+for+SQL+Server'
 app.config['SQLALCHEMY_DATABASE_URI'] = f"mssql+pyodbc://{encoded_user}:{encoded_pass}@{db_server}/{db_name}?driver={driver}&TrustServerCertificate=yes"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# pyodbc fast_executemany alleen voor de bulk-inserts van kaartjes (zie
+# _bulk_insert). Voor de hele engine aan geeft op NVARCHAR(MAX)-kolommen grote
+# buffers of "string data, right truncation", afhankelijk van de driver.
+DB_FAST_EXECUTEMANY = os.environ.get('DB_FAST_EXECUTEMANY', '1') == '1'
 
 db = SQLAlchemy(app)
 
@@ -105,15 +156,174 @@ class KanbanScanlijstItem(db.Model):
     reset_by = db.Column(db.String(255), nullable=True)
 
 
+class KanbanScanSpoolSegment(db.Model):
+    # Verwerkte spool-segmenten van function_app.py; een segment dat na een crash
+    # opnieuw wordt aangeboden, wordt hiermee herkend en niet dubbel geteld.
+    __tablename__ = 'Kanban_Scan_Spool_Segment'
+
+    segment_id = db.Column(db.String(100), primary_key=True)
+    applied_at = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow, index=True)
+    scans = db.Column(db.Integer, nullable=False)
+
+
+# Verhoog bij elke wijziging in ensure_scan_schema(), zodat de schemacache
+# vervalt en de migratiestap bij de volgende start opnieuw draait.
+SCHEMA_VERSION = 4
+
+# Alleen deze tabellen worden gereflecteerd; de rest van de database is voor
+# deze app niet relevant.
+AUTOMAP_TABLES = (
+    'Global_Catalogus',
+    'Lokaal_Artikel',
+    'Voorraad_Positie',
+    'Bedrijf',
+    'Vestiging',
+    'Ruimte',
+    'Ruimte_Type',
+    'Kast',
+    'Print_Queue',
+    'Leverancier',
+)
+
+PRINT_QUEUE_EXTRA_COLUMNS = (
+    ('kaart_id', 'NVARCHAR(36) NULL'),
+    ('claimed_at', 'DATETIME2 NULL'),
+    ('payload_json', 'NVARCHAR(MAX) NULL'),
+    ('payload_hash', 'NVARCHAR(64) NULL'),
+)
+
+
+SCAN_SCHEMA_INDEXES = (
+    # Maximaal één open scanregel per kaart; basis voor de MERGE in function_app.py.
+    ('UX_Kanban_Scanlijst_Item_open_kaart', 'Kanban_Scanlijst_Item',
+     "CREATE UNIQUE INDEX UX_Kanban_Scanlijst_Item_open_kaart "
+     "ON Kanban_Scanlijst_Item (kaart_id) WHERE reset_at IS NULL"),
+    # Wijzigingenfeed van de scanlijst: open regels per bedrijf op scantijd en
+    # recent gereset regels op reset_at.
+    ('IX_Kanban_Scanlijst_Item_bedrijf_reset_scan', 'Kanban_Scanlijst_Item',
+     "CREATE INDEX IX_Kanban_Scanlijst_Item_bedrijf_reset_scan "
+     "ON Kanban_Scanlijst_Item (bedrijf_id, reset_at, last_scanned_at)"),
+    # Barcode-opzoeking (/api/ean) wanneer een EAN nog niet in de zoekindex staat.
+    ('IX_Global_Catalogus_ean_code', 'Global_Catalogus',
+     "CREATE INDEX IX_Global_Catalogus_ean_code ON Global_Catalogus (ean_code)"),
+)
+
+
+def _ensure_index(index_name, table_name, ddl):
+    exists = db.session.execute(text("""
+        SELECT 1 FROM sys.indexes
+        WHERE name = :index_name AND object_id = OBJECT_ID(:table_name)
+    """), {"index_name": index_name, "table_name": table_name}).first()
+    if exists:
+        return
+    try:
+        db.session.execute(text(ddl))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"WAARSCHUWING: index {index_name} kon niet worden aangemaakt: {e}")
+
+
 def ensure_scan_schema():
     inspector = inspect(db.engine)
     db.create_all()
 
     if inspector.has_table('Print_Queue'):
         existing_columns = {col['name'] for col in inspector.get_columns('Print_Queue')}
-        if 'kaart_id' not in existing_columns:
-            db.session.execute(text("ALTER TABLE Print_Queue ADD kaart_id NVARCHAR(36) NULL"))
-            db.session.commit()
+        for column_name, column_ddl in PRINT_QUEUE_EXTRA_COLUMNS:
+            if column_name not in existing_columns:
+                db.session.execute(text(f"ALTER TABLE Print_Queue ADD {column_name} {column_ddl}"))
+                db.session.commit()
+
+    for index_name, table_name, ddl in SCAN_SCHEMA_INDEXES:
+        _ensure_index(index_name, table_name, ddl)
+
+# --- SCHEMA CACHE ---
+# Reflectie van Azure SQL kost bij elke worker-start seconden. De gereflecteerde
+# MetaData wordt daarom gepickled en hergebruikt zolang de vingerafdruk van het
+# schema (wijzigingsdatum, kolommen en indexen per tabel) niet verandert.
+
+def _schema_fingerprint():
+    table_names = AUTOMAP_TABLES + (KanbanKaart.__tablename__, KanbanScanlijstItem.__tablename__)
+    rows = db.session.execute(text("""
+        SELECT t.name,
+               t.modify_date,
+               (SELECT COUNT(*) FROM sys.columns c WHERE c.object_id = t.object_id) AS column_count,
+               (SELECT COUNT(*) FROM sys.indexes i WHERE i.object_id = t.object_id) AS index_count
+        FROM sys.tables t
+        WHERE t.name IN :table_names
+        ORDER BY t.name
+    """).bindparams(bindparam('table_names', expanding=True)), {"table_names": list(table_names)}).all()
+    parts = [f"schema={SCHEMA_VERSION}", f"sqlalchemy={sqlalchemy.__version__}"]
+    parts.extend(f"{row.name}|{row.modify_date.isoformat()}|{row.column_count}|{row.index_count}" for row in rows)
+    return hashlib.sha256("\n".join(parts).encode('utf-8')).hexdigest()
+
+def _load_cached_metadata(fingerprint):
+    if not SCHEMA_CACHE_PATH:
+        return None
+    try:
+        fd = os.open(SCHEMA_CACHE_PATH, os.O_RDONLY | getattr(os, 'O_NOFOLLOW', 0))
+    except FileNotFoundError:
+        return None
+    except OSError as exc:
+        print(f"Schemacache onleesbaar, volledige reflectie: {exc}")
+        return None
+    try:
+        with os.fdopen(fd, 'rb') as handle:
+            # Alleen een bestand van dit proces zelf vertrouwen: eigen uid, mode 0600.
+            stat = os.fstat(handle.fileno())
+            if hasattr(os, 'getuid') and (stat.st_uid != os.getuid() or stat.st_mode & 0o077):
+                print(f"WAARSCHUWING: schemacache {SCHEMA_CACHE_PATH} niet van deze gebruiker of niet 0600, genegeerd.")
+                return None
+            cached = pickle.load(handle)
+    except Exception as exc:
+        print(f"Schemacache onleesbaar, volledige reflectie: {exc}")
+        return None
+    if not isinstance(cached, dict) or cached.get('fingerprint') != fingerprint:
+        return None
+    return cached.get('metadata')
+
+def _store_cached_metadata(fingerprint, metadata):
+    if not SCHEMA_CACHE_PATH:
+        return
+    try:
+        os.makedirs(os.path.dirname(SCHEMA_CACHE_PATH) or '.', exist_ok=True)
+        tmp_path = f"{SCHEMA_CACHE_PATH}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_NOFOLLOW', 0), 0o600)
+        with os.fdopen(fd, 'wb') as handle:
+            pickle.dump({"fingerprint": fingerprint, "metadata": metadata}, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, SCHEMA_CACHE_PATH)
+    except Exception as exc:
+        print(f"Schemacache schrijven mislukt: {exc}")
+
+def load_schema_metadata():
+    """Geeft (metadata, timings) terug; reflecteert alleen bij een gewijzigd schema."""
+    timings = {}
+    started = time.perf_counter()
+    fingerprint = _schema_fingerprint()
+    timings['fingerprint'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    metadata = _load_cached_metadata(fingerprint)
+    timings['cache'] = time.perf_counter() - started
+    if metadata is not None:
+        return metadata, timings
+
+    started = time.perf_counter()
+    ensure_scan_schema()
+    # Na eventuele migraties opnieuw, zodat de volgende start een cache-hit is.
+    fingerprint = _schema_fingerprint()
+    timings['ensure_schema'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    metadata = MetaData()
+    metadata.reflect(db.engine, only=lambda table_name, _: table_name in AUTOMAP_TABLES)
+    timings['reflect'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    _store_cached_metadata(fingerprint, metadata)
+    timings['cache_write'] = time.perf_counter() - started
+    return metadata, timings
 
 # --- AUTOMAP & MODELS ---
 Base = automap_base()
@@ -131,27 +341,444 @@ Print_Queue = None
 Leverancier = None
 PREVIEW_LAYOUT_CACHE = None
 PREVIEW_LAYOUT_LOCK = threading.Lock()
+PRINT_REQUEST_FORMAT_CACHE = None
+PRINT_REQUEST_FORMAT_LOCK = threading.Lock()
+PRINT_HTTP_SESSION = None
+PRINT_HTTP_SESSION_LOCK = threading.Lock()
+PRINT_HEALTH_CACHE = None
+PRINT_HEALTH_LOCK = threading.Lock()
+PRINT_PAYLOAD_EXECUTOR = None
+PRINT_PAYLOAD_EXECUTOR_LOCK = threading.Lock()
+TENANT_CONTEXT_CACHE = {}
+TENANT_CONTEXT_VERSIONS = {}
+TENANT_CONTEXT_LOCK = threading.Lock()
+PRINT_IMAGE_CACHE = OrderedDict()
+PRINT_IMAGE_CACHE_LOCK = threading.Lock()
+PRINT_IMAGE_CACHE_STATS = {"hits": 0, "diskHits": 0, "misses": 0, "revalidated": 0, "staleServed": 0}
+PRINT_IMAGE_CACHE_DIR_READY = None
+PRINT_IMAGE_CACHE_DISK_COUNT = 0
+CATALOGUS_INDEX = None
+CATALOGUS_INDEX_VERSIE = 0
+CATALOGUS_INDEX_LOCK = threading.Lock()
+CATALOGUS_INDEX_BUILD_LOCK = threading.Lock()
+CATALOGUS_INDEX_VERVERSEN = False
+CATALOGUS_EAN_MISSERS = OrderedDict()
+
+DB_INIT_LOCK = threading.Lock()
+DB_INIT_DONE = False
+
+def init_database():
+    """Reflecteert het schema en vult de automap-modellen; hooguit één keer per proces.
+
+    Wordt lui aangeroepen (eerste request, CLI) of vooraf in de gunicorn-master,
+    zodat workers de modellen copy-on-write erven in plaats van zelf te reflecteren.
+    """
+    global DB_INIT_DONE, Base, db_operational
+    global Global_Catalogus, Lokaal_Artikel, Voorraad_Positie, Bedrijf, Vestiging
+    global Ruimte, Ruimte_Type, Kast, Print_Queue, Leverancier
+    if DB_INIT_DONE:
+        return db_operational
+    with DB_INIT_LOCK:
+        if DB_INIT_DONE:
+            return db_operational
+        with app.app_context():
+            try:
+                boot_started = time.perf_counter()
+                schema_metadata, boot_timings = load_schema_metadata()
+                prepare_started = time.perf_counter()
+                Base = automap_base(metadata=schema_metadata)
+                Base.prepare()
+                boot_timings['prepare'] = time.perf_counter() - prepare_started
+                Global_Catalogus = getattr(Base.classes, 'Global_Catalogus', None)
+                Lokaal_Artikel = getattr(Base.classes, 'Lokaal_Artikel', None)
+                Voorraad_Positie = getattr(Base.classes, 'Voorraad_Positie', None)
+                Bedrijf = getattr(Base.classes, 'Bedrijf', None)
+                Vestiging = getattr(Base.classes, 'Vestiging', None)
+                Ruimte = getattr(Base.classes, 'Ruimte', None)
+                Ruimte_Type = getattr(Base.classes, 'Ruimte_Type', None)
+                Kast = getattr(Base.classes, 'Kast', None)
+                Print_Queue = getattr(Base.classes, 'Print_Queue', None)
+                Leverancier = getattr(Base.classes, 'Leverancier', None)
+
+                if Global_Catalogus and Bedrijf:
+                    db_operational = True
+                    # Alleen na geslaagde reflectie afvinken; anders probeert het volgende request opnieuw.
+                    DB_INIT_DONE = True
+                    print("Database succesvol verbonden.")
+                boot_timings['totaal'] = time.perf_counter() - boot_started
+                bron = 'volledige reflectie' if 'reflect' in boot_timings else 'schemacache'
+                print(f"Opstarttijd database ({bron}, pid {os.getpid()}): " + ", ".join(
+                    f"{stap} {duur * 1000:.0f}ms" for stap, duur in boot_timings.items()
+                ))
+            except Exception as e:
+                print(f"CRITIQUE DB ERROR: {e}")
+            finally:
+                # Verbindingen uit de reflectie niet meenemen naar geforkte workers.
+                db.engine.dispose()
+    return db_operational
+
+def _reset_after_fork():
+    """Na een fork: geen sockets of threads van de parent hergebruiken."""
+    global PRINT_HTTP_SESSION, PRINT_PAYLOAD_EXECUTOR
+    global PRINT_HTTP_SESSION_LOCK, PRINT_PAYLOAD_EXECUTOR_LOCK
+    with app.app_context():
+        for engine in db.engines.values():
+            # close=False: de verbindingen blijven van de parent en worden hier niet gesloten.
+            engine.dispose(close=False)
+    PRINT_HTTP_SESSION = None
+    PRINT_HTTP_SESSION_LOCK = threading.Lock()
+    PRINT_PAYLOAD_EXECUTOR = None
+    PRINT_PAYLOAD_EXECUTOR_LOCK = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def create_app():
+    """Entry point voor gunicorn (`app:create_app()`): database vooraf initialiseren."""
+    init_database()
+    return app
+
+@app.before_request
+def ensure_database():
+    if request.endpoint == 'static':
+        return
+    init_database()
+
+# --- TENANT CONTEXT CACHE ---
+# Navbar-gegevens en badges worden per scope gecachet. Schrijfacties in deze
+# app verhogen de versie van hun scope en maken de cache direct ongeldig;
+# wijzigingen van buitenaf (andere workers, de scanfunctie) zijn na
+# TENANT_CONTEXT_TTL seconden zichtbaar.
+
+def _snapshot_row(row):
+    # Losse kopie van de kolomwaarden, los van sessie en threads.
+    return SimpleNamespace(**{
+        column.name: getattr(row, column.name, None)
+        for column in row.__table__.columns
+    })
+
+def bump_tenant_context(scope, bedrijf_id=None):
+    # Zonder bedrijf_id worden alle bedrijven binnen de scope ongeldig.
+    with TENANT_CONTEXT_LOCK:
+        if bedrijf_id is None:
+            keys = {key for key in TENANT_CONTEXT_CACHE if key[0] == scope}
+            keys.add((scope, None))
+        else:
+            keys = {(scope, bedrijf_id)}
+        for key in keys:
+            TENANT_CONTEXT_VERSIONS[key] = TENANT_CONTEXT_VERSIONS.get(key, 0) + 1
+
+def _cached_tenant_value(scope, bedrijf_id, loader):
+    key = (scope, bedrijf_id)
+    now = time.monotonic()
+    with TENANT_CONTEXT_LOCK:
+        version = TENANT_CONTEXT_VERSIONS.get(key, 0)
+        entry = TENANT_CONTEXT_CACHE.get(key)
+        if entry and entry["version"] == version and now < entry["expiresAt"]:
+            return entry["value"]
+
+    value = loader()
+    with TENANT_CONTEXT_LOCK:
+        if TENANT_CONTEXT_VERSIONS.get(key, 0) == version:
+            TENANT_CONTEXT_CACHE[key] = {"version": version, "expiresAt": now + TENANT_CONTEXT_TTL, "value": value}
+    return value
+
+def get_alle_bedrijven():
+    return _cached_tenant_value(
+        'bedrijven', None,
+        lambda: [_snapshot_row(bedrijf) for bedrijf in db.session.query(Bedrijf).order_by(Bedrijf.naam).all()]
+    )
+
+def get_open_scan_count(bedrijf_id):
+    return _cached_tenant_value(
+        'open_scans', bedrijf_id,
+        lambda: db.session.query(KanbanScanlijstItem).filter(
+            KanbanScanlijstItem.bedrijf_id == bedrijf_id,
+            KanbanScanlijstItem.reset_at.is_(None)
+        ).count()
+    )
+
+def get_print_queue_count(bedrijf_id):
+    return _cached_tenant_value(
+        'print_queue', bedrijf_id,
+        lambda: db.session.query(Print_Queue).filter_by(bedrijf_id=bedrijf_id, status='PENDING').count()
+    )
 
-with app.app_context():
+# --- CATALOGUS ZOEKINDEX ---
+# Global_Catalogus wordt per proces in het geheugen geïndexeerd op woorden
+# (naam, EAN, categorie). Zoeken gebruikt prefixen via een gesorteerde
+# woordenlijst en trigrammen voor treffers midden in een woord. Wijzigingen
+# via beheer_catalogus werken de index direct per item bij; wijzigingen in
+# andere workers zijn na CATALOGUS_INDEX_TTL seconden zichtbaar. Na die TTL
+# blijft de bestaande index in gebruik terwijl één achtergrondthread een
+# nieuwe opbouwt; alleen de allereerste opbouw gebeurt in een request. Dezelfde
+# index bevat een hashmap op genormaliseerde EAN voor barcode-opzoekingen.
+
+CatalogusItem = namedtuple('CatalogusItem', 'global_id generieke_naam ean_code categorie foto_url')
+
+def _normaliseer_zoektekst(value):
+    tekst = unicodedata.normalize('NFKD', str(value or ''))
+    return ''.join(teken for teken in tekst if not unicodedata.combining(teken)).lower()
+
+def _zoek_tokens(value):
+    return re.findall(r'[0-9a-z]+', _normaliseer_zoektekst(value))
+
+def _normaliseer_ean(value):
+    """Alleen letters en cijfers; numerieke codes zonder voorloopnullen (UPC-A, EAN-13 en GTIN-14 vallen samen)."""
+    code = re.sub(r'[^0-9A-Za-z]', '', str(value or '')).upper()
+    if code.isdigit():
+        return code.lstrip('0') or code
+    return code
+
+def _ean_varianten(code):
+    """Vormen waarin een EAN in de database kan staan: zoals gescand, genormaliseerd en aangevuld met nullen."""
+    ean = _normaliseer_ean(code)
+    varianten = {str(code).strip(), ean}
+    if ean.isdigit():
+        varianten.update(ean.zfill(lengte) for lengte in (8, 12, 13, 14) if len(ean) <= lengte)
+    return sorted(varianten)
+
+def _trigrammen(token):
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+def _catalogus_item(row):
+    return CatalogusItem(*(getattr(row, veld, None) for veld in CatalogusItem._fields))
+
+def _index_verwijderen(index, global_id):
+    item = index['items'].pop(global_id, None)
+    if item is None:
+        return
+    for token in index['item_tokens'].pop(global_id):
+        ids = index['tokens'][token]
+        ids.discard(global_id)
+        if not ids:
+            del index['tokens'][token]
+            del index['token_lijst'][bisect.bisect_left(index['token_lijst'], token)]
+        for trigram in _trigrammen(token):
+            trigram_ids = index['trigrammen'].get(trigram)
+            if trigram_ids is not None:
+                trigram_ids.discard(global_id)
+                if not trigram_ids:
+                    del index['trigrammen'][trigram]
+    sorteer_sleutel = index['sorteer'].pop(global_id)
+    positie = bisect.bisect_left(index['gesorteerd'], sorteer_sleutel)
+    if positie < len(index['gesorteerd']) and index['gesorteerd'][positie] == sorteer_sleutel:
+        del index['gesorteerd'][positie]
+    ean = _normaliseer_ean(item.ean_code)
+    ean_ids = index['ean'].get(ean)
+    if ean_ids is not None:
+        ean_ids.discard(global_id)
+        if not ean_ids:
+            del index['ean'][ean]
+
+def _index_toevoegen(index, item, bulk=False):
+    """Voegt een item toe of vervangt het; bij bulk sorteert de aanroeper token_lijst en gesorteerd achteraf."""
+    _index_verwijderen(index, item.global_id)
+    tokens = set(_zoek_tokens(' '.join(filter(None, (item.generieke_naam, item.ean_code, item.categorie)))))
+    index['items'][item.global_id] = item
+    index['item_tokens'][item.global_id] = tokens
+    sorteer_sleutel = (_normaliseer_zoektekst(item.generieke_naam), item.global_id)
+    index['sorteer'][item.global_id] = sorteer_sleutel
+    if bulk:
+        index['gesorteerd'].append(sorteer_sleutel)
+    else:
+        bisect.insort(index['gesorteerd'], sorteer_sleutel)
+    ean = _normaliseer_ean(item.ean_code)
+    if ean:
+        index['ean'].setdefault(ean, set()).add(item.global_id)
+    for token in tokens:
+        if token not in index['tokens']:
+            index['tokens'][token] = set()
+            if bulk:
+                index['token_lijst'].append(token)
+            else:
+                bisect.insort(index['token_lijst'], token)
+        index['tokens'][token].add(item.global_id)
+        for trigram in _trigrammen(token):
+            index['trigrammen'].setdefault(trigram, set()).add(item.global_id)
+
+def _bouw_catalogus_index():
+    index = {
+        'items': {}, 'item_tokens': {}, 'sorteer': {}, 'gesorteerd': [],
+        'tokens': {}, 'token_lijst': [], 'trigrammen': {}, 'ean': {}
+    }
+    rows = db.session.query(*(
+        getattr(Global_Catalogus, veld) for veld in CatalogusItem._fields
+    )).all()
+    for row in rows:
+        _index_toevoegen(index, _catalogus_item(row), bulk=True)
+    index['token_lijst'].sort()
+    index['gesorteerd'].sort()
+    return index
+
+def _plaats_nieuwe_catalogus_index():
+    """Bouwt een nieuwe index op en zet hem actief; geeft hem terug."""
+    global CATALOGUS_INDEX
+    with CATALOGUS_INDEX_LOCK:
+        versie = CATALOGUS_INDEX_VERSIE
+
+    index = _bouw_catalogus_index()
+    with CATALOGUS_INDEX_LOCK:
+        # Tijdens het opbouwen gewijzigd: deze versie mag gebruikt worden, maar wordt bij de volgende zoekactie vervangen.
+        verloopt = CATALOGUS_INDEX_TTL if versie == CATALOGUS_INDEX_VERSIE else 0
+        index['expiresAt'] = time.monotonic() + verloopt
+        CATALOGUS_INDEX = index
+        CATALOGUS_EAN_MISSERS.clear()
+    return index
+
+def _ververs_catalogus_index():
+    global CATALOGUS_INDEX_VERVERSEN
     try:
-        ensure_scan_schema()
-        Base.prepare(db.engine, reflect=True)
-        Global_Catalogus = getattr(Base.classes, 'Global_Catalogus', None)
-        Lokaal_Artikel = getattr(Base.classes, 'Lokaal_Artikel', None)
-        Voorraad_Positie = getattr(Base.classes, 'Voorraad_Positie', None)
-        Bedrijf = getattr(Base.classes, 'Bedrijf', None)
-        Vestiging = getattr(Base.classes, 'Vestiging', None)
-        Ruimte = getattr(Base.classes, 'Ruimte', None)
-        Ruimte_Type = getattr(Base.classes, 'Ruimte_Type', None)
-        Kast = getattr(Base.classes, 'Kast', None)
-        Print_Queue = getattr(Base.classes, 'Print_Queue', None)
-        Leverancier = getattr(Base.classes, 'Leverancier', None)
-
-        if Global_Catalogus and Bedrijf:
-            db_operational = True
-            print("Database succesvol verbonden.")
+        with app.app_context():
+            _plaats_nieuwe_catalogus_index()
     except Exception as e:
-        print(f"CRITIQUE DB ERROR: {e}")
+        print(f"WAARSCHUWING: catalogusindex verversen mislukt: {e}")
+        with CATALOGUS_INDEX_LOCK:
+            # Oude index nog een TTL gebruiken in plaats van bij elke zoekactie opnieuw te proberen.
+            if CATALOGUS_INDEX:
+                CATALOGUS_INDEX['expiresAt'] = time.monotonic() + CATALOGUS_INDEX_TTL
+    finally:
+        with CATALOGUS_INDEX_LOCK:
+            CATALOGUS_INDEX_VERVERSEN = False
+
+def _get_catalogus_index():
+    """Geeft de actuele index terug.
+
+    Een verlopen index wordt gewoon teruggegeven terwijl één achtergrondthread
+    een nieuwe opbouwt. Zonder index bouwt één request hem op en wachten
+    gelijktijdige requests daarop.
+    """
+    global CATALOGUS_INDEX_VERVERSEN
+    with CATALOGUS_INDEX_LOCK:
+        index = CATALOGUS_INDEX
+        if index is not None:
+            if time.monotonic() >= index['expiresAt'] and not CATALOGUS_INDEX_VERVERSEN:
+                CATALOGUS_INDEX_VERVERSEN = True
+                threading.Thread(target=_ververs_catalogus_index, name="catalogus-index", daemon=True).start()
+            return index
+
+    with CATALOGUS_INDEX_BUILD_LOCK:
+        with CATALOGUS_INDEX_LOCK:
+            if CATALOGUS_INDEX is not None:
+                return CATALOGUS_INDEX
+        return _plaats_nieuwe_catalogus_index()
+
+def catalogus_index_bijwerken(item):
+    """Verwerkt een opgeslagen catalogus-item in de index (na commit aanroepen)."""
+    global CATALOGUS_INDEX_VERSIE
+    with CATALOGUS_INDEX_LOCK:
+        CATALOGUS_INDEX_VERSIE += 1
+        CATALOGUS_EAN_MISSERS.clear()
+        if CATALOGUS_INDEX:
+            _index_toevoegen(CATALOGUS_INDEX, _catalogus_item(item))
+
+def catalogus_index_verwijderen(global_id):
+    global CATALOGUS_INDEX_VERSIE
+    with CATALOGUS_INDEX_LOCK:
+        CATALOGUS_INDEX_VERSIE += 1
+        if CATALOGUS_INDEX:
+            _index_verwijderen(CATALOGUS_INDEX, global_id)
+
+def _zoek_term(index, term):
+    """Score per global_id voor één zoekterm: 2 = heel woord, 1 = begin van woord, 0 = midden in woord."""
+    treffers = {}
+    token_lijst = index['token_lijst']
+    positie = bisect.bisect_left(token_lijst, term)
+    while positie < len(token_lijst) and token_lijst[positie].startswith(term):
+        token = token_lijst[positie]
+        score = 2 if token == term else 1
+        for global_id in index['tokens'][token]:
+            if treffers.get(global_id, -1) < score:
+                treffers[global_id] = score
+        positie += 1
+    trigrammen = _trigrammen(term)
+    if trigrammen:
+        sets = [index['trigrammen'].get(trigram) for trigram in trigrammen]
+        if all(sets):
+            for global_id in set.intersection(*sets):
+                if global_id not in treffers and any(term in token for token in index['item_tokens'][global_id]):
+                    treffers[global_id] = 0
+    return treffers
+
+def zoek_catalogus(zoekterm, offset=0, limit=None, uitsluiten=frozenset()):
+    """Geeft (pagina, totaal): CatalogusItems op de zoekterm, beste treffers eerst; zonder zoekterm op naam.
+
+    global_ids in `uitsluiten` tellen niet mee. Zonder zoekterm stopt de lus na
+    offset + limit treffers; met zoekterm wordt alleen de pagina gesorteerd,
+    buiten de lock.
+    """
+    index = _get_catalogus_index()
+    termen = _zoek_tokens(zoekterm)
+    einde = None if limit is None else offset + limit
+    with CATALOGUS_INDEX_LOCK:
+        items = index['items']
+        if not termen:
+            totaal = len(items) - sum(1 for global_id in uitsluiten if global_id in items)
+            pagina = []
+            for _, global_id in index['gesorteerd']:
+                if global_id in uitsluiten:
+                    continue
+                pagina.append(items[global_id])
+                if einde is not None and len(pagina) >= einde:
+                    break
+            return pagina[offset:], totaal
+        scores = None
+        for term in termen:
+            treffers = _zoek_term(index, term)
+            if scores is None:
+                scores = treffers
+            else:
+                scores = {global_id: score + treffers[global_id] for global_id, score in scores.items() if global_id in treffers}
+            if not scores:
+                return [], 0
+        sorteer = index['sorteer']
+        kandidaten = [
+            (-score, sorteer[global_id], global_id, items[global_id])
+            for global_id, score in scores.items() if global_id not in uitsluiten
+        ]
+    volgorde = sorted(kandidaten) if einde is None else heapq.nsmallest(einde, kandidaten)
+    return [kandidaat[3] for kandidaat in volgorde[offset:]], len(kandidaten)
+
+def zoek_ean(code):
+    """CatalogusItems met deze EAN via de hashmap.
+
+    Bij een misser volgt één geïndexeerde query op ean_code over alle vormen
+    uit _ean_varianten. Blijft die leeg, dan wordt de misser
+    CATALOGUS_EAN_MISS_TTL seconden onthouden, zodat een herhaald onbekende
+    barcode niet telkens de database raakt.
+    """
+    ean = _normaliseer_ean(code)
+    if not ean:
+        return []
+    index = _get_catalogus_index()
+    with CATALOGUS_INDEX_LOCK:
+        global_ids = index['ean'].get(ean)
+        if global_ids:
+            return sorted((index['items'][global_id] for global_id in global_ids), key=lambda item: index['sorteer'][item.global_id])
+        verloopt = CATALOGUS_EAN_MISSERS.get(ean)
+        if verloopt is not None and time.monotonic() < verloopt:
+            return []
+
+    # Mogelijk net in een andere worker toegevoegd; gevonden items direct opnemen.
+    gevonden = [
+        _catalogus_item(row) for row in db.session.query(*(
+            getattr(Global_Catalogus, veld) for veld in CatalogusItem._fields
+        )).filter(Global_Catalogus.ean_code.in_(_ean_varianten(code))).all()
+    ]
+    with CATALOGUS_INDEX_LOCK:
+        for item in gevonden:
+            _index_toevoegen(index, item)
+        if not gevonden:
+            CATALOGUS_EAN_MISSERS[ean] = time.monotonic() + CATALOGUS_EAN_MISS_TTL
+            CATALOGUS_EAN_MISSERS.move_to_end(ean)
+            while len(CATALOGUS_EAN_MISSERS) > CATALOGUS_EAN_MISS_MAX_ITEMS:
+                CATALOGUS_EAN_MISSERS.popitem(last=False)
+    return gevonden
+
+def catalogus_aantal():
+    index = _get_catalogus_index()
+    with CATALOGUS_INDEX_LOCK:
+        return len(index['items'])
 
 # --- CONTEXT PROCESSOR ---
 
@@ -167,19 +794,14 @@ def inject_context():
             app_build_datetime=format_build_datetime(APP_BUILD_DATETIME)
         )
     
-    # Huidig bedrijf ophalen
+    # Huidig bedrijf uit g (before_request), de bedrijvenlijst uit de cache
     bedrijf_id = get_huidig_bedrijf_id()
-    bedrijf = db.session.query(Bedrijf).filter(Bedrijf.bedrijf_id == bedrijf_id).first() if bedrijf_id else None
-    
-    # NIEUW: Alle bedrijven ophalen voor de selector in de navbar
-    alle_bedrijven = db.session.query(Bedrijf).order_by(Bedrijf.naam).all()
+    bedrijf = g.get('huidig_bedrijf')
+    alle_bedrijven = get_alle_bedrijven()
     open_scan_count = 0
     if bedrijf_id:
         try:
-            open_scan_count = db.session.query(KanbanScanlijstItem).filter(
-                KanbanScanlijstItem.bedrijf_id == bedrijf_id,
-                KanbanScanlijstItem.reset_at.is_(None)
-            ).count()
+            open_scan_count = get_open_scan_count(bedrijf_id)
         except Exception:
             open_scan_count = 0
     
@@ -191,21 +813,80 @@ def inject_context():
         app_build_datetime=format_build_datetime(APP_BUILD_DATETIME)
     )
 
-def get_huidig_bedrijf_id():
+def _resolve_huidig_bedrijf():
     bedrijf_id = session.get('bedrijf_id')
     if not db_operational or not Bedrijf:
-        return bedrijf_id
+        return bedrijf_id, None
 
+    alle_bedrijven = get_alle_bedrijven()
     if bedrijf_id:
-        bedrijf = db.session.query(Bedrijf).filter(Bedrijf.bedrijf_id == bedrijf_id).first()
+        bedrijf = next((b for b in alle_bedrijven if b.bedrijf_id == bedrijf_id), None)
         if bedrijf:
-            return bedrijf_id
-
-    eerste = db.session.query(Bedrijf).order_by(Bedrijf.bedrijf_id).first()
+            return bedrijf_id, bedrijf
+        # Mogelijk net aangemaakt in een andere worker: één keer controleren.
+        rij = db.session.get(Bedrijf, bedrijf_id)
+        if rij:
+            bump_tenant_context('bedrijven')
+            return bedrijf_id, _snapshot_row(rij)
+
+    eerste = min(alle_bedrijven, key=lambda b: b.bedrijf_id, default=None)
     if eerste:
         session['bedrijf_id'] = eerste.bedrijf_id
-        return eerste.bedrijf_id
-    return None
+        return eerste.bedrijf_id, eerste
+    return None, None
+
+@app.before_request
+def load_huidig_bedrijf():
+    # Eén keer per request; routes, get_scoped_item en templates lezen uit g.
+    if request.endpoint == 'static':
+        return
+    g.bedrijf_id, g.huidig_bedrijf = _resolve_huidig_bedrijf()
+
+def get_huidig_bedrijf_id():
+    if not has_request_context():
+        # CLI en print-worker: geen sessie, dus geen huidig bedrijf.
+        return None
+    if 'bedrijf_id' not in g:
+        g.bedrijf_id, g.huidig_bedrijf = _resolve_huidig_bedrijf()
+    return g.bedrijf_id
+
+def get_huidig_bedrijf():
+    """Het Bedrijf-ORM-object van dit request, hooguit één keer geladen."""
+    bedrijf_id = get_huidig_bedrijf_id()
+    if not bedrijf_id:
+        return None
+    if 'huidig_bedrijf_rij' not in g:
+        g.huidig_bedrijf_rij = db.session.get(Bedrijf, bedrijf_id)
+    return g.huidig_bedrijf_rij
+
+def set_huidig_bedrijf(bedrijf_id):
+    session['bedrijf_id'] = bedrijf_id
+    for key in ('bedrijf_id', 'huidig_bedrijf', 'huidig_bedrijf_rij'):
+        g.pop(key, None)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _fast_executemany_on_request(conn, cursor, statement, parameters, context, executemany):
+    # Alleen statements met execution option fast_executemany (een lijst input sizes).
+    input_sizes = context.execution_options.get('fast_executemany') if executemany and context else None
+    if input_sizes is None:
+        return
+    cursor.setinputsizes(input_sizes)
+    cursor.fast_executemany = True
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_request_query(conn, cursor, statement, parameters, context, executemany):
+    if QUERY_COUNT_HEADER and has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+
+@app.after_request
+def add_query_count_header(response):
+    if not QUERY_COUNT_HEADER:
+        return response
+    query_count = g.get('query_count', 0)
+    response.headers['X-Query-Count'] = str(query_count)
+    if request.endpoint != 'static':
+        app.logger.debug("%s %s: %s queries", request.method, request.path, query_count)
+    return response
 
 def check_db():
     if not db_operational:
@@ -217,6 +898,8 @@ def _pk_name(model):
     return next(iter(model.__table__.primary_key.columns)).name
 
 def get_scoped_item(model, item_id, bedrijf_id):
+    if model is Bedrijf and item_id is not None and item_id == bedrijf_id == get_huidig_bedrijf_id():
+        return get_huidig_bedrijf()
     query = db.session.query(model).filter(getattr(model, _pk_name(model)) == item_id)
     if hasattr(model, 'bedrijf_id'):
         query = query.filter(model.bedrijf_id == bedrijf_id)
@@ -321,12 +1004,8 @@ def _get_reset_actor():
     )
 
 
-def _create_kanban_card(pos, art, kast, ruimte, bedrijf):
-    human_code = _generate_human_code()
-    while db.session.query(KanbanKaart).filter(KanbanKaart.human_code == human_code).first():
-        human_code = _generate_human_code()
-
-    card = KanbanKaart(
+def _kanban_card_values(pos, art, kast, bedrijf, human_code):
+    return dict(
         kaart_id=str(uuid.uuid4()),
         bedrijf_id=bedrijf.bedrijf_id,
         voorraad_positie_id=pos.voorraad_positie_id,
@@ -336,18 +1015,16 @@ def _create_kanban_card(pos, art, kast, ruimte, bedrijf):
         location_text=f"{kast.naam} ({kast.type_opslag})",
         product_sku=str(art.lokaal_artikel_id),
         status='PENDING_PRINT',
-        created_at=utcnow()
+        created_at=utcnow(),
+        printed_at=None,
+        cancelled_at=None
     )
-    db.session.add(card)
-    db.session.flush()
-    return card
 
-def create_queue_item(pos, art, global_item, kast, ruimte, r_type, bedrijf):
+def _print_queue_values(pos, art, global_item, kast, ruimte, r_type, bedrijf, card_values):
     header_text = ruimte.naam.upper()
     if ruimte.nummer: header_text = f"{ruimte.nummer} {header_text}"
-    card = _create_kanban_card(pos, art, kast, ruimte, bedrijf)
 
-    queue_kwargs = dict(
+    queue_values = dict(
         bedrijf_id=bedrijf.bedrijf_id,
         status='PENDING',
         printer_id="reception-badgy-01",
@@ -361,14 +1038,106 @@ def create_queue_item(pos, art, global_item, kast, ruimte, r_type, bedrijf):
         location_text=f"{kast.naam} ({kast.type_opslag})",
         min_level=pos.trigger_min,
         max_level=pos.target_max,
-        qr_code_value=_generate_public_scan_url(card.public_token),
-        qr_human_readable=card.human_code,
+        qr_code_value=_generate_public_scan_url(card_values['public_token']),
+        qr_human_readable=card_values['human_code'],
         company_logo_url=bedrijf.logo_url
     )
     if hasattr(Print_Queue, 'kaart_id'):
-        queue_kwargs['kaart_id'] = card.kaart_id
+        queue_values['kaart_id'] = card_values['kaart_id']
+    return queue_values
+
+def _create_kanban_card(pos, art, kast, ruimte, bedrijf):
+    human_code = _reserve_human_codes(1)[0]
+    card = KanbanKaart(**_kanban_card_values(pos, art, kast, bedrijf, human_code))
+    db.session.add(card)
+    db.session.flush()
+    return card
+
+def create_queue_item(pos, art, global_item, kast, ruimte, r_type, bedrijf):
+    card = _create_kanban_card(pos, art, kast, ruimte, bedrijf)
+    card_values = {"kaart_id": card.kaart_id, "public_token": card.public_token, "human_code": card.human_code}
+    return Print_Queue(**_print_queue_values(pos, art, global_item, kast, ruimte, r_type, bedrijf, card_values))
+
+# Ruim onder de limiet van 2100 parameters per statement van SQL Server.
+BULK_IN_CHUNK_SIZE = 1000
+
+def _chunked(values, size=BULK_IN_CHUNK_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+def _reserve_human_codes(count):
+    """Genereert `count` unieke human codes; per ronde één IN-query tegen de database."""
+    codes = set()
+    while len(codes) < count:
+        candidates = set()
+        while len(candidates) < count - len(codes):
+            code = _generate_human_code()
+            if code not in codes:
+                candidates.add(code)
+        taken = set()
+        for chunk in _chunked(candidates):
+            taken.update(
+                code for (code,) in db.session.query(KanbanKaart.human_code).filter(KanbanKaart.human_code.in_(chunk))
+            )
+        codes.update(candidates - taken)
+    return list(codes)
+
+def _bulk_insert(table, values):
+    """INSERT van veel rijen; op pyodbc met fast_executemany voor alleen dit statement.
+
+    SQLAlchemy zou er batches INSERT ... VALUES van maken (insertmanyvalues); een
+    driver-statement gaat via cursor.executemany. NVARCHAR(MAX)-kolommen krijgen
+    een expliciete input size, zodat pyodbc geen buffer per rij schat.
+    """
+    connection = db.session.connection()
+    if not (DB_FAST_EXECUTEMANY and connection.dialect.driver == 'pyodbc'):
+        connection.execute(table.insert(), values)
+        return
+    import pyodbc
+    columns = list(values[0])
+    input_sizes = [
+        (pyodbc.SQL_WVARCHAR, 0, 0)
+        if isinstance(table.c[column].type, sqlalchemy.String) and table.c[column].type.length is None
+        else None
+        for column in columns
+    ]
+    connection.exec_driver_sql(
+        f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+        [tuple(row[column] for column in columns) for row in values],
+        execution_options={'fast_executemany': input_sizes}
+    )
+
+def create_queue_items_bulk(rows):
+    """Maakt kaarten en printopdrachten voor veel posities tegelijk; geeft de print_ids terug.
 
-    return Print_Queue(**queue_kwargs)
+    `rows` zijn tuples zoals create_queue_item ze verwacht. Kaarten en
+    printopdrachten gaan met executemany naar de database; de print_ids worden
+    daarna in één query per chunk via kaart_id opgehaald. Commit is aan de aanroeper.
+    """
+    if not rows:
+        return []
+    human_codes = _reserve_human_codes(len(rows))
+    card_values = []
+    queue_values = []
+    for row, human_code in zip(rows, human_codes):
+        pos, art, global_item, kast, ruimte, r_type, bedrijf = row
+        card = _kanban_card_values(pos, art, kast, bedrijf, human_code)
+        card_values.append(card)
+        queue_values.append(_print_queue_values(pos, art, global_item, kast, ruimte, r_type, bedrijf, card))
+
+    _bulk_insert(KanbanKaart.__table__, card_values)
+    _bulk_insert(Print_Queue.__table__, queue_values)
+
+    if not hasattr(Print_Queue, 'kaart_id'):
+        # Zonder kaart_id-kolom is er geen betrouwbare koppeling terug; geen precompute.
+        return []
+    print_ids = []
+    for chunk in _chunked(card['kaart_id'] for card in card_values):
+        print_ids.extend(
+            print_id for (print_id,) in db.session.query(Print_Queue.print_id).filter(Print_Queue.kaart_id.in_(chunk))
+        )
+    return print_ids
 
 
 def _get_queue_card(queue_item):
@@ -394,17 +1163,178 @@ def _mark_card_cancelled(queue_item):
     card.status = 'CANCELLED'
     card.cancelled_at = utcnow()
 
+def _http_session():
+    global PRINT_HTTP_SESSION
+    with PRINT_HTTP_SESSION_LOCK:
+        if PRINT_HTTP_SESSION is None:
+            # Alleen verbindingsfouten en GET/HEAD worden herhaald; een POST
+            # naar de printer die de service al bereikt heeft, nooit.
+            retry = Retry(
+                total=PRINT_HTTP_RETRIES,
+                connect=PRINT_HTTP_RETRIES,
+                read=PRINT_HTTP_RETRIES,
+                status=PRINT_HTTP_RETRIES,
+                backoff_factor=PRINT_HTTP_BACKOFF,
+                status_forcelist=(502, 503, 504),
+                allowed_methods=frozenset({'GET', 'HEAD'}),
+                raise_on_status=False
+            )
+            adapter = HTTPAdapter(
+                pool_connections=4,
+                pool_maxsize=max(PRINT_HTTP_POOL_SIZE, PRINT_DISPATCH_CONCURRENCY),
+                max_retries=retry
+            )
+            http_session = requests.Session()
+            http_session.mount('http://', adapter)
+            http_session.mount('https://', adapter)
+            # De sessie wordt gedeeld tussen threads; geen cookie-state bijhouden.
+            http_session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+            PRINT_HTTP_SESSION = http_session
+        return PRINT_HTTP_SESSION
+
+def _image_cache_dir_ready():
+    """Maakt de cachemap (0700) aan en controleert eigenaar en rechten; één keer per proces."""
+    global PRINT_IMAGE_CACHE_DIR_READY, PRINT_IMAGE_CACHE_DISK_COUNT
+    if PRINT_IMAGE_CACHE_DIR_READY is not None:
+        return PRINT_IMAGE_CACHE_DIR_READY
+    with PRINT_IMAGE_CACHE_LOCK:
+        if PRINT_IMAGE_CACHE_DIR_READY is not None:
+            return PRINT_IMAGE_CACHE_DIR_READY
+        ready = False
+        try:
+            os.makedirs(PRINT_IMAGE_CACHE_DIR, mode=0o700, exist_ok=True)
+            info = os.lstat(PRINT_IMAGE_CACHE_DIR)
+            if (os.path.isdir(PRINT_IMAGE_CACHE_DIR) and not os.path.islink(PRINT_IMAGE_CACHE_DIR)
+                    and info.st_uid == os.getuid() and not info.st_mode & 0o077):
+                PRINT_IMAGE_CACHE_DISK_COUNT = sum(
+                    1 for entry in os.scandir(PRINT_IMAGE_CACHE_DIR) if entry.name.endswith('.json')
+                )
+                ready = True
+            else:
+                print(f"WAARSCHUWING: afbeeldingscache {PRINT_IMAGE_CACHE_DIR} is niet van deze gebruiker of niet 0700; schijfcache uit.")
+        except OSError as exc:
+            print(f"WAARSCHUWING: afbeeldingscache {PRINT_IMAGE_CACHE_DIR} onbruikbaar, schijfcache uit: {exc}")
+        PRINT_IMAGE_CACHE_DIR_READY = ready
+    return ready
+
+def _image_cache_path(key):
+    if not PRINT_IMAGE_CACHE_DIR or PRINT_IMAGE_CACHE_MAX_DISK_ITEMS <= 0 or not _image_cache_dir_ready():
+        return None
+    return os.path.join(PRINT_IMAGE_CACHE_DIR, f"{key}.json")
+
+def _count_image_cache(stat):
+    with PRINT_IMAGE_CACHE_LOCK:
+        PRINT_IMAGE_CACHE_STATS[stat] += 1
+
+def _prune_image_cache_dir():
+    """Ruimt de oudste bestanden op tot 90% van de limiet; geeft het aantal resterende terug."""
+    try:
+        entries = [entry for entry in os.scandir(PRINT_IMAGE_CACHE_DIR) if entry.name.endswith('.json')]
+    except OSError:
+        return 0
+    # Onder de limiet opruimen, zodat niet elke volgende schrijfactie weer een scandir kost.
+    overflow = len(entries) - PRINT_IMAGE_CACHE_MAX_DISK_ITEMS * 9 // 10
+    if overflow <= 0:
+        return len(entries)
+    entries.sort(key=lambda entry: entry.stat().st_mtime)
+    for entry in entries[:overflow]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+    return len(entries) - overflow
+
+def _image_cache_put(key, entry, persist=True):
+    with PRINT_IMAGE_CACHE_LOCK:
+        PRINT_IMAGE_CACHE[key] = entry
+        PRINT_IMAGE_CACHE.move_to_end(key)
+        while len(PRINT_IMAGE_CACHE) > PRINT_IMAGE_CACHE_MAX_ITEMS:
+            PRINT_IMAGE_CACHE.popitem(last=False)
+
+    path = _image_cache_path(key) if persist else None
+    if not path:
+        return
+    global PRINT_IMAGE_CACHE_DISK_COUNT
+    try:
+        is_new = not os.path.exists(path)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as handle:
+            json.dump(entry, handle)
+        os.replace(tmp_path, path)
+        # Teller i.p.v. een scandir per schrijfactie; andere processen schrijven
+        # ook in de map, dus bij opruimen wordt hij op de werkelijke stand gezet.
+        with PRINT_IMAGE_CACHE_LOCK:
+            PRINT_IMAGE_CACHE_DISK_COUNT += is_new
+            prune = PRINT_IMAGE_CACHE_DISK_COUNT > PRINT_IMAGE_CACHE_MAX_DISK_ITEMS
+        if prune:
+            remaining = _prune_image_cache_dir()
+            with PRINT_IMAGE_CACHE_LOCK:
+                PRINT_IMAGE_CACHE_DISK_COUNT = remaining
+    except OSError as exc:
+        print(f"Afbeeldingscache schrijven mislukt: {exc}")
+
+def _image_cache_get(key):
+    with PRINT_IMAGE_CACHE_LOCK:
+        entry = PRINT_IMAGE_CACHE.get(key)
+        if entry is not None:
+            PRINT_IMAGE_CACHE.move_to_end(key)
+            return entry, 'memory'
+
+    path = _image_cache_path(key)
+    if not path:
+        return None, None
+    try:
+        with open(path, 'r', encoding='utf-8') as handle:
+            entry = json.load(handle)
+    except (OSError, ValueError):
+        return None, None
+    if not isinstance(entry, dict) or not entry.get('dataUri'):
+        return None, None
+    _image_cache_put(key, entry, persist=False)
+    return entry, 'disk'
+
+def get_image_cache_stats():
+    with PRINT_IMAGE_CACHE_LOCK:
+        stats = dict(PRINT_IMAGE_CACHE_STATS)
+        stats["memoryItems"] = len(PRINT_IMAGE_CACHE)
+    stats["maxItems"] = PRINT_IMAGE_CACHE_MAX_ITEMS
+    stats["ttlSeconds"] = PRINT_IMAGE_CACHE_TTL
+    stats["diskDir"] = PRINT_IMAGE_CACHE_DIR if _image_cache_path('x') else None
+    return stats
+
 def _image_to_base64_object(image_source, label):
     if not image_source:
         return None, f"{label} ontbreekt."
-
     if isinstance(image_source, str) and image_source.startswith("data:image/"):
         return {"base64Data": image_source}, None
 
+    # Cache op URL; de al gecodeerde data-URI wordt bewaard en na de TTL
+    # met ETag/Last-Modified gerevalideerd in plaats van opnieuw gedownload.
+    key = hashlib.sha256(image_source.encode('utf-8')).hexdigest()
+    cached, cache_source = _image_cache_get(key)
+    now = time.time()
+    if cached and now - cached.get('checkedAt', 0) < PRINT_IMAGE_CACHE_TTL:
+        _count_image_cache('hits' if cache_source == 'memory' else 'diskHits')
+        return {"base64Data": cached['dataUri']}, None
+
+    headers = {}
+    if cached and cached.get('etag'):
+        headers["If-None-Match"] = cached['etag']
+    if cached and cached.get('lastModified'):
+        headers["If-Modified-Since"] = cached['lastModified']
+
     try:
-        response = requests.get(image_source, timeout=PRINT_REQUEST_TIMEOUT)
+        response = _http_session().get(image_source, headers=headers, timeout=PRINT_REQUEST_TIMEOUT)
+        if cached and response.status_code == 304:
+            _image_cache_put(key, dict(cached, checkedAt=now))
+            _count_image_cache('revalidated')
+            return {"base64Data": cached['dataUri']}, None
         response.raise_for_status()
     except requests.RequestException as exc:
+        if cached:
+            _count_image_cache('staleServed')
+            return {"base64Data": cached['dataUri']}, None
         return None, f"{label} kon niet worden opgehaald: {exc}"
 
     content_type = response.headers.get("Content-Type", "").split(";")[0].strip()
@@ -413,7 +1343,36 @@ def _image_to_base64_object(image_source, label):
         content_type = guessed_type or "image/png"
 
     encoded = base64.b64encode(response.content).decode("ascii")
-    return {"base64Data": f"data:{content_type};base64,{encoded}"}, None
+    data_uri = f"data:{content_type};base64,{encoded}"
+    _image_cache_put(key, {
+        "url": image_source,
+        "dataUri": data_uri,
+        "contentHash": hashlib.sha256(response.content).hexdigest(),
+        "etag": response.headers.get("ETag"),
+        "lastModified": response.headers.get("Last-Modified"),
+        "checkedAt": now
+    })
+    _count_image_cache('misses')
+    return {"base64Data": data_uri}, None
+
+PRINT_PAYLOAD_FIELDS = (
+    'printer_id', 'card_type', 'header_text', 'header_color', 'product_name',
+    'product_packaging', 'product_sku', 'product_image_url', 'location_text',
+    'min_level', 'max_level', 'qr_code_value', 'qr_human_readable', 'company_logo_url',
+)
+
+def _print_payload_fingerprint(queue_item):
+    # Een opgeslagen payload is alleen geldig zolang de bronvelden gelijk zijn.
+    values = [str(getattr(queue_item, field, None)) for field in PRINT_PAYLOAD_FIELDS]
+    return hashlib.sha256("\x1f".join(values).encode('utf-8')).hexdigest()
+
+def _stored_print_payload(queue_item):
+    payload_json = getattr(queue_item, 'payload_json', None)
+    if not payload_json:
+        return None
+    if getattr(queue_item, 'payload_hash', None) != _print_payload_fingerprint(queue_item):
+        return None
+    return payload_json
 
 def _build_print_payload(queue_item):
     product = {
@@ -494,7 +1453,7 @@ def _print_service_headers():
         headers["X-API-Key"] = PRINT_SERVICE_API_KEY
     return headers, None
 
-def _discover_preview_layout_endpoint():
+def _fetch_print_request_format():
     headers, header_err = _print_service_headers()
     if header_err:
         raise RuntimeError(header_err)
@@ -504,7 +1463,7 @@ def _discover_preview_layout_endpoint():
         raise RuntimeError("PRINT_SERVICE_URL ontbreekt of is ongeldig.")
 
     try:
-        response = requests.get(
+        response = _http_session().get(
             request_format_url,
             headers=headers,
             timeout=PRINT_REQUEST_TIMEOUT
@@ -515,7 +1474,61 @@ def _discover_preview_layout_endpoint():
         raise RuntimeError(f"request-format endpoint faalde: {exc}") from exc
     except ValueError as exc:
         raise RuntimeError("request-format endpoint gaf geen geldige JSON terug.") from exc
+    if not isinstance(body, dict):
+        raise RuntimeError("request-format endpoint gaf geen geldige JSON terug.")
+    return body
+
+def get_print_request_format(force_refresh=False):
+    global PRINT_REQUEST_FORMAT_CACHE
+    now = int(time.time())
+    with PRINT_REQUEST_FORMAT_LOCK:
+        cached = PRINT_REQUEST_FORMAT_CACHE
+    if cached and not force_refresh and now <= cached["nextRefreshAt"]:
+        return cached
+
+    body = _fetch_print_request_format()
+    latest = {
+        "body": body,
+        "batchDisabled": False,
+        "nextRefreshAt": now + DEFAULT_LAYOUT_REFRESH_SECONDS
+    }
+    with PRINT_REQUEST_FORMAT_LOCK:
+        PRINT_REQUEST_FORMAT_CACHE = latest
+    return latest
+
+def _disable_print_batch():
+    # De service adverteerde batch-ondersteuning maar weigerde het endpoint;
+    # tot de volgende refresh van request-format alleen losse kaartjes sturen.
+    with PRINT_REQUEST_FORMAT_LOCK:
+        if PRINT_REQUEST_FORMAT_CACHE:
+            PRINT_REQUEST_FORMAT_CACHE["batchDisabled"] = True
+
+def _print_batch_settings():
+    if PRINT_BATCH_MODE == 'off' or PRINT_BATCH_SIZE <= 1:
+        return None, 1
+    try:
+        request_format = get_print_request_format()
+    except RuntimeError:
+        return None, 1
+    if request_format.get("batchDisabled"):
+        return None, 1
+
+    body = request_format["body"]
+    endpoint = body.get('batchEndpoint')
+    if not isinstance(endpoint, str) or not endpoint.strip():
+        return None, 1
+    batch_url = _resolve_print_service_api_url(endpoint)
+    if not batch_url:
+        return None, 1
+
+    batch_size = PRINT_BATCH_SIZE
+    max_batch_size = body.get('maxBatchSize')
+    if isinstance(max_batch_size, int) and max_batch_size > 0:
+        batch_size = min(batch_size, max_batch_size)
+    return batch_url, batch_size
 
+def _discover_preview_layout_endpoint():
+    body = get_print_request_format()["body"]
     endpoint = body.get('previewLayoutEndpoint') or '/api/v1/layout-config'
     if not isinstance(endpoint, str) or not endpoint.strip():
         endpoint = '/api/v1/layout-config'
@@ -531,7 +1544,7 @@ def _fetch_preview_layout_config(endpoint):
         raise RuntimeError("PRINT_SERVICE_URL ontbreekt of is ongeldig.")
 
     try:
-        response = requests.get(
+        response = _http_session().get(
             layout_url,
             headers=headers,
             timeout=PRINT_REQUEST_TIMEOUT
@@ -611,7 +1624,24 @@ def get_preview_layout(force_refresh=False):
             f"Geen layoutconfig beschikbaar. Controleer de printservice en probeer opnieuw. ({exc})"
         ) from exc
 
-def test_print_service_connectivity():
+def _get_cached_print_health():
+    with PRINT_HEALTH_LOCK:
+        if PRINT_HEALTH_CACHE and time.monotonic() < PRINT_HEALTH_CACHE["expiresAt"]:
+            return PRINT_HEALTH_CACHE["result"]
+    return None
+
+def _set_cached_print_health(result):
+    global PRINT_HEALTH_CACHE
+    with PRINT_HEALTH_LOCK:
+        if result[0] and PRINT_HEALTH_CACHE_TTL > 0:
+            PRINT_HEALTH_CACHE = {"result": result, "expiresAt": time.monotonic() + PRINT_HEALTH_CACHE_TTL}
+        else:
+            PRINT_HEALTH_CACHE = None
+
+def _invalidate_print_health():
+    _set_cached_print_health((False, None))
+
+def _probe_print_service():
     if not PRINT_SERVICE_URL:
         return False, "PRINT_SERVICE_URL ontbreekt."
 
@@ -631,7 +1661,7 @@ def test_print_service_connectivity():
         headers, header_err = _print_service_headers()
         if header_err:
             return False, header_err
-        resp = requests.get(root_url, headers=headers, timeout=PRINT_REQUEST_TIMEOUT)
+        resp = _http_session().get(root_url, headers=headers, timeout=PRINT_REQUEST_TIMEOUT)
         if resp.status_code >= 400:
             return False, f"Service bereikbaar, maar health-check gaf HTTP {resp.status_code}."
     except requests.RequestException as exc:
@@ -639,11 +1669,31 @@ def test_print_service_connectivity():
 
     return True, f"Verbonden met printservice op {parsed.hostname}:{port}."
 
+def test_print_service_connectivity(force=False):
+    # Een geslaagde check blijft PRINT_HEALTH_CACHE_TTL seconden geldig, zodat
+    # niet voor elk kaartje opnieuw een poort- en health-check nodig is.
+    if not force:
+        cached = _get_cached_print_health()
+        if cached:
+            return cached
+    result = _probe_print_service()
+    _set_cached_print_health(result)
+    return result
+
+def _print_payload_json(queue_item):
+    payload_json = _stored_print_payload(queue_item)
+    if payload_json:
+        return payload_json, None
+    payload, payload_error = _build_print_payload(queue_item)
+    if payload_error:
+        return None, payload_error
+    return json.dumps(payload, separators=(',', ':')), None
+
 def send_queue_item_to_print_service(queue_item):
     if not PRINT_SERVICE_URL:
         return False, "PRINT_SERVICE_URL ontbreekt."
 
-    payload, payload_error = _build_print_payload(queue_item)
+    payload_json, payload_error = _print_payload_json(queue_item)
     if payload_error:
         return False, payload_error
     headers, header_err = _print_service_headers()
@@ -651,17 +1701,323 @@ def send_queue_item_to_print_service(queue_item):
         return False, header_err
 
     try:
-        response = requests.post(
+        response = _http_session().post(
             PRINT_SERVICE_URL,
-            json=payload,
-            headers=headers,
+            data=payload_json.encode('utf-8'),
+            headers={**headers, "Content-Type": "application/json"},
             timeout=PRINT_REQUEST_TIMEOUT
         )
         response.raise_for_status()
         return True, None
+    except requests.ConnectionError as exc:
+        _invalidate_print_health()
+        return False, f"Printservice fout: {exc}"
     except requests.RequestException as exc:
         return False, f"Printservice fout: {exc}"
 
+def send_queue_items_batch_to_print_service(queue_items, batch_url):
+    """Stuurt meerdere kaartjes voor dezelfde printer in één request; geeft (item, ok, fout) per kaartje."""
+    results = []
+    prepared = []
+    for queue_item in queue_items:
+        payload_json, payload_error = _print_payload_json(queue_item)
+        if payload_error:
+            results.append((queue_item, False, payload_error))
+        else:
+            prepared.append((queue_item, payload_json))
+    if not prepared:
+        return results
+
+    headers, header_err = _print_service_headers()
+    if header_err:
+        return results + [(queue_item, False, header_err) for queue_item, _ in prepared]
+
+    printer_id = prepared[0][0].printer_id or "reception-badgy-01"
+    # De payloads zijn al JSON; direct samenvoegen voorkomt opnieuw parsen.
+    body = (
+        '{"printerId":' + json.dumps(printer_id)
+        + ',"cards":[' + ','.join(payload_json for _, payload_json in prepared) + ']}'
+    )
+    try:
+        response = _http_session().post(
+            batch_url,
+            data=body.encode('utf-8'),
+            headers={**headers, "Content-Type": "application/json"},
+            timeout=(PRINT_CONNECT_TIMEOUT, PRINT_REQUEST_TIMEOUT * len(prepared))
+        )
+        if response.status_code in (404, 405, 501):
+            _disable_print_batch()
+            return results + [
+                (queue_item, *send_queue_item_to_print_service(queue_item))
+                for queue_item, _ in prepared
+            ]
+        response.raise_for_status()
+    except requests.RequestException as exc:
+        if isinstance(exc, requests.ConnectionError):
+            _invalidate_print_health()
+        return results + [(queue_item, False, f"Printservice fout: {exc}") for queue_item, _ in prepared]
+
+    try:
+        card_results = response.json().get('results')
+    except (ValueError, AttributeError):
+        card_results = None
+    if not isinstance(card_results, list):
+        # Zonder resultaten per kaartje is niet te zeggen wat er geprint is; in de wachtrij laten.
+        return results + [
+            (queue_item, False, "Printservice gaf een onleesbaar antwoord; controleer of het kaartje is geprint.")
+            for queue_item, _ in prepared
+        ]
+
+    by_index = {}
+    for position, card_result in enumerate(card_results):
+        if isinstance(card_result, dict):
+            by_index[card_result.get('index', position)] = card_result
+    for index, (queue_item, _) in enumerate(prepared):
+        card_result = by_index.get(index)
+        if card_result is None:
+            results.append((queue_item, False, "Printservice gaf geen resultaat voor dit kaartje."))
+        elif card_result.get('ok'):
+            results.append((queue_item, True, None))
+        else:
+            results.append((queue_item, False, f"Printservice fout: {card_result.get('error') or 'onbekend'}"))
+    return results
+
+def _send_print_chunk(queue_items, batch_url=None):
+    if batch_url and len(queue_items) > 1:
+        return send_queue_items_batch_to_print_service(queue_items, batch_url)
+    return [(queue_item, *send_queue_item_to_print_service(queue_item)) for queue_item in queue_items]
+
+def _chunk_print_items(queue_items, batch_size):
+    chunks = []
+    by_printer = OrderedDict()
+    for queue_item in queue_items:
+        by_printer.setdefault(queue_item.printer_id or "reception-badgy-01", []).append(queue_item)
+    for printer_items in by_printer.values():
+        for start in range(0, len(printer_items), batch_size):
+            chunks.append(printer_items[start:start + batch_size])
+    return chunks
+
+def dispatch_queue_items(items, concurrency=None):
+    """Verstuurt printopdrachten parallel; elk geslaagd kaartje wordt direct apart gecommit."""
+    if not items:
+        return []
+
+    concurrency = max(1, concurrency or PRINT_DISPATCH_CONCURRENCY)
+    items_by_id = {item.print_id: item for item in items}
+    snapshots = [_snapshot_row(item) for item in items]
+    order = {snapshot.print_id: index for index, snapshot in enumerate(snapshots)}
+    results = []
+
+    batch_url, batch_size = _print_batch_settings()
+    chunks = _chunk_print_items(snapshots, batch_size)
+
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(chunks))) as executor:
+        futures = {
+            executor.submit(_send_print_chunk, chunk, batch_url): chunk
+            for chunk in chunks
+        }
+        for future in as_completed(futures):
+            try:
+                chunk_results = future.result()
+            except Exception as exc:
+                chunk_results = [(snapshot, False, f"Onverwachte fout: {exc}") for snapshot in futures[future]]
+
+            for snapshot, sent, error_msg in chunk_results:
+                if sent:
+                    try:
+                        _mark_card_printed(snapshot)
+                        db.session.delete(items_by_id[snapshot.print_id])
+                        db.session.commit()
+                    except Exception as exc:
+                        db.session.rollback()
+                        sent, error_msg = False, f"Verstuurd, maar verwerken in wachtrij mislukt: {exc}"
+
+                results.append({
+                    "print_id": snapshot.print_id,
+                    "human_code": snapshot.qr_human_readable,
+                    "ok": sent,
+                    "error": error_msg
+                })
+
+    results.sort(key=lambda result: order[result["print_id"]])
+    return results
+
+def claim_print_jobs(from_status, limit, bedrijf_id=None, print_id=None):
+    """Zet maximaal `limit` opdrachten atomair van `from_status` naar SENDING en geeft de ids terug."""
+    filters = ["status = :from_status"]
+    params = {"from_status": from_status, "limit": int(limit), "now": utcnow()}
+    if bedrijf_id is not None:
+        filters.append("bedrijf_id = :bedrijf_id")
+        params["bedrijf_id"] = bedrijf_id
+    if print_id is not None:
+        filters.append("print_id = :print_id")
+        params["print_id"] = print_id
+
+    # READPAST slaat rijen over die een andere worker of request al vasthoudt,
+    # zodat twee gelijktijdige claims nooit dezelfde opdracht krijgen.
+    claimed_ids = db.session.execute(text(f"""
+        WITH claimable AS (
+            SELECT TOP (:limit) print_id, status, claimed_at
+            FROM Print_Queue WITH (ROWLOCK, UPDLOCK, READPAST)
+            WHERE {' AND '.join(filters)}
+            ORDER BY aangemaakt_op, print_id
+        )
+        UPDATE claimable
+        SET status = 'SENDING', claimed_at = :now
+        OUTPUT inserted.print_id
+    """), params).scalars().all()
+    db.session.commit()
+    bump_tenant_context('print_queue', bedrijf_id)
+    return list(claimed_ids)
+
+def release_print_jobs(print_ids, status='PENDING'):
+    if not print_ids:
+        return 0
+    released = db.session.query(Print_Queue).filter(
+        Print_Queue.print_id.in_(print_ids),
+        Print_Queue.status == 'SENDING'
+    ).update({"status": status, "claimed_at": None}, synchronize_session=False)
+    db.session.commit()
+    bump_tenant_context('print_queue')
+    return released
+
+def release_stale_print_jobs(bedrijf_id=None):
+    # Claims van een gecrashte worker of een afgebroken request komen terug als
+    # PENDING, zodat een assistent zelf beslist of het kaartje opnieuw geprint
+    # moet worden. Draait in de printworker én bij het openen/versturen van de
+    # printwachtrij, zodat de inline modus niet van de worker afhankelijk is.
+    cutoff = utcnow() - datetime.timedelta(seconds=PRINT_CLAIM_TIMEOUT)
+    query = db.session.query(Print_Queue).filter(
+        Print_Queue.status == 'SENDING',
+        or_(Print_Queue.claimed_at.is_(None), Print_Queue.claimed_at < cutoff)
+    )
+    if bedrijf_id is not None:
+        query = query.filter(Print_Queue.bedrijf_id == bedrijf_id)
+    released = query.update({"status": 'PENDING', "claimed_at": None}, synchronize_session=False)
+    db.session.commit()
+    if released:
+        bump_tenant_context('print_queue', bedrijf_id)
+    return released
+
+def enqueue_print_jobs(bedrijf_id, print_id=None):
+    query = db.session.query(Print_Queue).filter(
+        Print_Queue.bedrijf_id == bedrijf_id,
+        Print_Queue.status == 'PENDING'
+    )
+    if print_id is not None:
+        query = query.filter(Print_Queue.print_id == print_id)
+    queued = query.update({"status": 'QUEUED'}, synchronize_session=False)
+    db.session.commit()
+    bump_tenant_context('print_queue', bedrijf_id)
+    return queued
+
+def dispatch_claimed_print_jobs(print_ids, concurrency=None):
+    if not print_ids:
+        return []
+    items = db.session.query(Print_Queue).filter(
+        Print_Queue.print_id.in_(print_ids),
+        Print_Queue.status == 'SENDING'
+    ).order_by(Print_Queue.aangemaakt_op.asc(), Print_Queue.print_id.asc()).all()
+    results = dispatch_queue_items(items, concurrency)
+    release_print_jobs([result["print_id"] for result in results if not result["ok"]])
+    return results
+
+def _precompute_print_payloads(print_ids):
+    with app.app_context():
+        try:
+            items = db.session.query(Print_Queue).filter(
+                Print_Queue.print_id.in_(print_ids),
+                Print_Queue.status.in_(('PENDING', 'QUEUED'))
+            ).all()
+            for item in items:
+                payload, payload_error = _build_print_payload(item)
+                if payload_error:
+                    continue
+                # Conditionele update: een opdracht die intussen geclaimd of
+                # verwijderd is, wordt niet meer aangeraakt.
+                db.session.query(Print_Queue).filter(
+                    Print_Queue.print_id == item.print_id,
+                    Print_Queue.status.in_(('PENDING', 'QUEUED'))
+                ).update({
+                    "payload_json": json.dumps(payload, separators=(',', ':')),
+                    "payload_hash": _print_payload_fingerprint(item)
+                }, synchronize_session=False)
+                db.session.commit()
+        except Exception as exc:
+            db.session.rollback()
+            print(f"Payload voorbereiden mislukt: {exc}")
+
+def schedule_print_payload_build(print_ids):
+    global PRINT_PAYLOAD_EXECUTOR
+    if not PRINT_PRECOMPUTE_PAYLOAD or not print_ids or not hasattr(Print_Queue, 'payload_json'):
+        return
+    with PRINT_PAYLOAD_EXECUTOR_LOCK:
+        if PRINT_PAYLOAD_EXECUTOR is None:
+            PRINT_PAYLOAD_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix='print-payload')
+        PRINT_PAYLOAD_EXECUTOR.submit(_precompute_print_payloads, list(print_ids))
+
+def refresh_queued_print_images(column_name, new_url, match, *filters):
+    """Zet een nieuwe afbeelding-URL op openstaande opdrachten en bouwt hun payload opnieuw op."""
+    if not new_url or not hasattr(Print_Queue, 'payload_json'):
+        return 0
+    column = getattr(Print_Queue, column_name)
+    affected_ids = [
+        print_id for (print_id,) in db.session.query(Print_Queue.print_id).filter(
+            Print_Queue.status.in_(('PENDING', 'QUEUED')),
+            match(column),
+            *filters
+        ).all()
+    ]
+    if not affected_ids:
+        return 0
+    db.session.query(Print_Queue).filter(Print_Queue.print_id.in_(affected_ids)).update(
+        {column_name: new_url, "payload_json": None, "payload_hash": None},
+        synchronize_session=False
+    )
+    db.session.commit()
+    schedule_print_payload_build(affected_ids)
+    return len(affected_ids)
+
+@app.cli.command('print-worker')
+@click.option('--batch-size', default=PRINT_WORKER_BATCH_SIZE, show_default=True, help='Aantal opdrachten per claim.')
+@click.option('--poll-interval', default=PRINT_WORKER_POLL_INTERVAL, show_default=True, help='Wachttijd in seconden als de wachtrij leeg is.')
+@click.option('--once', is_flag=True, help='Verwerk een enkele batch en stop.')
+def print_worker_command(batch_size, poll_interval, once):
+    """Verstuurt aangevraagde printopdrachten (QUEUED) op de achtergrond."""
+    if not init_database():
+        raise click.ClickException("Geen verbinding met de database.")
+
+    print(f"Printworker gestart (batch {batch_size}, parallel {PRINT_DISPATCH_CONCURRENCY}).")
+    while True:
+        claimed_ids = []
+        try:
+            stale = release_stale_print_jobs()
+            if stale:
+                print(f"{stale} verlopen claim(s) teruggezet naar PENDING.")
+
+            ok, detail = test_print_service_connectivity()
+            if ok:
+                claimed_ids = claim_print_jobs('QUEUED', batch_size)
+                results = dispatch_claimed_print_jobs(claimed_ids)
+                for result in results:
+                    if not result["ok"]:
+                        print(f"Printopdracht {result['print_id']} mislukt: {result['error']}")
+                if results:
+                    sent = sum(1 for result in results if result["ok"])
+                    print(f"{sent}/{len(results)} kaartje(s) verstuurd.")
+            else:
+                print(detail)
+        except Exception as exc:
+            db.session.rollback()
+            print(f"Printworker fout: {exc}")
+        finally:
+            db.session.remove()
+
+        if once:
+            break
+        if len(claimed_ids) < batch_size:
+            time.sleep(poll_interval)
+
 # --- ROUTES ---
 
 @app.route('/')
@@ -674,14 +2030,8 @@ def dashboard():
     huidig_id = get_huidig_bedrijf_id()
     if huidig_id:
         try:
-            print_queue_count = db.session.query(Print_Queue).filter_by(
-                bedrijf_id=huidig_id, 
-                status='PENDING'
-            ).count()
-            open_scan_count = db.session.query(KanbanScanlijstItem).filter(
-                KanbanScanlijstItem.bedrijf_id == huidig_id,
-                KanbanScanlijstItem.reset_at.is_(None)
-            ).count()
+            print_queue_count = get_print_queue_count(huidig_id)
+            open_scan_count = get_open_scan_count(huidig_id)
         except Exception:
             print_queue_count = 0
             open_scan_count = 0
@@ -700,7 +2050,7 @@ def switch_bedrijf(bedrijf_id):
     if not bestaat:
         flash('Bedrijf niet gevonden.', 'warning')
         return redirect(url_for('dashboard'))
-    session['bedrijf_id'] = bedrijf_id
+    set_huidig_bedrijf(bedrijf_id)
     flash('Bedrijf gewijzigd.', 'info')
     return redirect(url_for('dashboard'))
 
@@ -714,7 +2064,8 @@ def nieuw_bedrijf():
             nieuw = Bedrijf(naam=naam)
             db.session.add(nieuw)
             db.session.commit()
-            session['bedrijf_id'] = nieuw.bedrijf_id
+            bump_tenant_context('bedrijven')
+            set_huidig_bedrijf(nieuw.bedrijf_id)
             flash(f'Bedrijf "{naam}" aangemaakt en geselecteerd.', 'success')
         except IntegrityError:
             db.session.rollback()
@@ -731,20 +2082,63 @@ def nieuw_bedrijf():
 # maar in het echte bestand moeten ze behouden blijven.
 # Hieronder staan ALLE routes die we eerder hadden, ongewijzigd:
 
+def _get_kamer_overzicht_rows(bedrijf_id):
+    """Alle ruimtes met aantallen kasten, posities en open scans in één query."""
+    kast_counts = db.session.query(
+        Kast.ruimte_id.label('ruimte_id'),
+        func.count(Kast.kast_id).label('kast_count')
+    ).filter(Kast.bedrijf_id == bedrijf_id).group_by(Kast.ruimte_id).subquery()
+
+    positie_counts = db.session.query(
+        Kast.ruimte_id.label('ruimte_id'),
+        func.count(Voorraad_Positie.voorraad_positie_id).label('positie_count')
+    ).join(
+        Voorraad_Positie, Voorraad_Positie.kast_id == Kast.kast_id
+    ).filter(
+        Kast.bedrijf_id == bedrijf_id,
+        Voorraad_Positie.bedrijf_id == bedrijf_id
+    ).group_by(Kast.ruimte_id).subquery()
+
+    scan_counts = db.session.query(
+        Kast.ruimte_id.label('ruimte_id'),
+        func.count(KanbanScanlijstItem.scanlijst_item_id).label('open_scan_count')
+    ).join(
+        KanbanKaart, KanbanScanlijstItem.kaart_id == KanbanKaart.kaart_id
+    ).join(
+        Voorraad_Positie, KanbanKaart.voorraad_positie_id == Voorraad_Positie.voorraad_positie_id
+    ).join(
+        Kast, Voorraad_Positie.kast_id == Kast.kast_id
+    ).filter(
+        KanbanScanlijstItem.bedrijf_id == bedrijf_id,
+        KanbanScanlijstItem.reset_at.is_(None)
+    ).group_by(Kast.ruimte_id).subquery()
+
+    return db.session.query(
+        Ruimte,
+        Vestiging,
+        func.coalesce(kast_counts.c.kast_count, 0),
+        func.coalesce(positie_counts.c.positie_count, 0),
+        func.coalesce(scan_counts.c.open_scan_count, 0)
+    ).join(
+        Vestiging, Ruimte.vestiging_id == Vestiging.vestiging_id
+    ).outerjoin(
+        kast_counts, kast_counts.c.ruimte_id == Ruimte.ruimte_id
+    ).outerjoin(
+        positie_counts, positie_counts.c.ruimte_id == Ruimte.ruimte_id
+    ).outerjoin(
+        scan_counts, scan_counts.c.ruimte_id == Ruimte.ruimte_id
+    ).filter(
+        Vestiging.bedrijf_id == bedrijf_id
+    ).order_by(Vestiging.naam, Ruimte.nummer, Ruimte.naam).all()
+
 @app.route('/assistent/kamers')
 def assistent_kamers():
     if not check_db(): return redirect(url_for('dashboard'))
     bedrijf_id = get_huidig_bedrijf_id()
     try:
-        ruimtes_query = db.session.query(Ruimte, Vestiging)\
-            .join(Vestiging, Ruimte.vestiging_id == Vestiging.vestiging_id)\
-            .filter(Vestiging.bedrijf_id == bedrijf_id)\
-            .order_by(Vestiging.naam, Ruimte.nummer, Ruimte.naam).all() 
-        ruimtes_data = []
-        for ruimte, vestiging in ruimtes_query:
-            count = db.session.query(Kast).filter_by(ruimte_id=ruimte.ruimte_id, bedrijf_id=bedrijf_id).count()
-            ruimtes_data.append((ruimte, vestiging, count))
-        return render_template('assistent_kamer_selectie.html', ruimtes=ruimtes_data)
+        ruimtes_data = _get_kamer_overzicht_rows(bedrijf_id)
+        vestigingen = list({row[1].vestiging_id: row[1] for row in ruimtes_data}.values())
+        return render_template('assistent_kamer_selectie.html', ruimtes=ruimtes_data, vestigingen=vestigingen)
     except Exception as e:
         print(f"Error: {e}")
         return redirect(url_for('dashboard'))
@@ -754,31 +2148,97 @@ def assistent_kamer_view(ruimte_id):
     if not check_db(): return redirect(url_for('dashboard'))
     bedrijf_id = get_huidig_bedrijf_id()
     
-    ruimte = db.session.query(Ruimte).filter(Ruimte.ruimte_id == ruimte_id, Ruimte.bedrijf_id == bedrijf_id).first()
-    if not ruimte:
+    ruimte_rij = db.session.query(Ruimte, Ruimte_Type.kleur_hex).outerjoin(
+        Ruimte_Type,
+        (Ruimte.ruimte_type_id == Ruimte_Type.ruimte_type_id) & (Ruimte_Type.bedrijf_id == bedrijf_id)
+    ).filter(Ruimte.ruimte_id == ruimte_id, Ruimte.bedrijf_id == bedrijf_id).first()
+    if not ruimte_rij:
         flash('Ruimte niet gevonden of geen toegang.', 'warning')
         return redirect(url_for('assistent_kamers'))
+    ruimte, kleur_hex = ruimte_rij
 
-    if ruimte.ruimte_type_id:
-        rt = db.session.query(Ruimte_Type).filter(
-            Ruimte_Type.ruimte_type_id == ruimte.ruimte_type_id,
-            Ruimte_Type.bedrijf_id == bedrijf_id
-        ).first()
-        ruimte.kleur_hex = rt.kleur_hex if rt else None
-    else:
-        ruimte.kleur_hex = None
+    # Alle kasten met inhoud in één query; lege kasten komen mee via de outer join.
+    rows = db.session.query(Kast, Voorraad_Positie, Lokaal_Artikel, Global_Catalogus).outerjoin(
+        Voorraad_Positie,
+        (Voorraad_Positie.kast_id == Kast.kast_id) & (Voorraad_Positie.bedrijf_id == bedrijf_id)
+    ).outerjoin(
+        Lokaal_Artikel, Voorraad_Positie.lokaal_artikel_id == Lokaal_Artikel.lokaal_artikel_id
+    ).outerjoin(
+        Global_Catalogus, Lokaal_Artikel.global_id == Global_Catalogus.global_id
+    ).filter(
+        Kast.ruimte_id == ruimte_id, Kast.bedrijf_id == bedrijf_id
+    ).order_by(Kast.kast_id, Voorraad_Positie.voorraad_positie_id).all()
 
-    kasten_in_kamer = db.session.query(Kast).filter_by(ruimte_id=ruimte_id, bedrijf_id=bedrijf_id).all()
     kasten_data = {}
-    for kast in kasten_in_kamer:
-        inhoud = db.session.query(Voorraad_Positie, Lokaal_Artikel, Global_Catalogus)\
-            .join(Lokaal_Artikel, Voorraad_Positie.lokaal_artikel_id == Lokaal_Artikel.lokaal_artikel_id)\
-            .outerjoin(Global_Catalogus, Lokaal_Artikel.global_id == Global_Catalogus.global_id)\
-            .filter(Voorraad_Positie.kast_id == kast.kast_id, Voorraad_Positie.bedrijf_id == bedrijf_id)\
-            .all()
-        kasten_data[kast] = inhoud
-    alle_artikelen = db.session.query(Lokaal_Artikel).filter_by(bedrijf_id=bedrijf_id).order_by(Lokaal_Artikel.eigen_naam).all()
-    return render_template('assistent_kamer_view.html', ruimte=ruimte, kasten_data=kasten_data, alle_artikelen=alle_artikelen)
+    for kast, positie, lokaal, globaal in rows:
+        inhoud = kasten_data.setdefault(kast, [])
+        if positie is not None and lokaal is not None:
+            inhoud.append((positie, lokaal, globaal))
+    return render_template('assistent_kamer_view.html', ruimte=ruimte, kleur_hex=kleur_hex, kasten_data=kasten_data)
+
+@app.route('/api/lokale-artikelen')
+def api_lokale_artikelen():
+    """Zoekt lokale artikelen van het huidige bedrijf voor de toevoeg-keuzelijst."""
+    if not db_operational:
+        return jsonify([])
+    bedrijf_id = get_huidig_bedrijf_id()
+    zoekterm = (request.args.get('q') or '').strip()
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 50)
+    if len(zoekterm) < 2:
+        return jsonify([])
+
+    artikelen = db.session.query(
+        Lokaal_Artikel.lokaal_artikel_id,
+        Lokaal_Artikel.eigen_naam,
+        Lokaal_Artikel.verpakkingseenheid_tekst
+    ).filter(
+        Lokaal_Artikel.bedrijf_id == bedrijf_id,
+        Lokaal_Artikel.eigen_naam.contains(zoekterm, autoescape=True)
+    ).order_by(Lokaal_Artikel.eigen_naam).limit(limit).all()
+    return jsonify([
+        {'id': a.lokaal_artikel_id, 'naam': a.eigen_naam, 'verpakking': a.verpakkingseenheid_tekst}
+        for a in artikelen
+    ])
+
+@app.route('/api/catalogus/zoeken')
+def api_catalogus_zoeken():
+    """Typeahead over de gedeelde catalogus via de zoekindex, gepagineerd met offset."""
+    if not db_operational:
+        return jsonify({"ok": False, "error": "Geen verbinding met de database."}), 503
+    bedrijf_id = get_huidig_bedrijf_id()
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', CATALOGUS_ZOEK_PAGE_SIZE, type=int), 1), 100)
+    gekoppeld_query = db.session.query(Lokaal_Artikel.global_id).filter(
+        Lokaal_Artikel.bedrijf_id == bedrijf_id,
+        Lokaal_Artikel.global_id.isnot(None)
+    )
+    if request.args.get('beschikbaar') == '1':
+        # Alle gekoppelde ids zijn nodig om ze uit de treffers te laten.
+        gekoppeld = {global_id for (global_id,) in gekoppeld_query}
+        pagina, totaal = zoek_catalogus(request.args.get('q'), offset, limit, uitsluiten=gekoppeld)
+    else:
+        pagina, totaal = zoek_catalogus(request.args.get('q'), offset, limit)
+        gekoppeld = {
+            global_id for (global_id,) in gekoppeld_query.filter(
+                Lokaal_Artikel.global_id.in_([item.global_id for item in pagina])
+            )
+        } if pagina else set()
+    return jsonify({
+        "ok": True,
+        "total": totaal,
+        "next_offset": offset + limit if offset + limit < totaal else None,
+        "items": [
+            {
+                "id": item.global_id,
+                "naam": item.generieke_naam,
+                "ean": item.ean_code,
+                "categorie": item.categorie,
+                "foto_url": item.foto_url,
+                "gekoppeld": item.global_id in gekoppeld
+            }
+            for item in pagina
+        ]
+    })
 
 @app.route('/assistent/update-voorraad/<int:voorraad_positie_id>', methods=['POST'])
 def update_voorraad_positie(voorraad_positie_id):
@@ -830,23 +2290,24 @@ def add_to_kast_from_room(kast_id):
         flash('Artikel zit al in de kast.', 'warning')
     return redirect(url_for('assistent_kamer_view', ruimte_id=kast.ruimte_id))
 
+def _kanban_aanvraag_query(bedrijf_id):
+    return db.session.query(Voorraad_Positie, Lokaal_Artikel, Global_Catalogus, Kast, Ruimte, Ruimte_Type, Bedrijf)\
+        .join(Lokaal_Artikel, Voorraad_Positie.lokaal_artikel_id == Lokaal_Artikel.lokaal_artikel_id)\
+        .outerjoin(Global_Catalogus, Lokaal_Artikel.global_id == Global_Catalogus.global_id)\
+        .join(Kast, Voorraad_Positie.kast_id == Kast.kast_id)\
+        .join(Ruimte, Kast.ruimte_id == Ruimte.ruimte_id)\
+        .outerjoin(Ruimte_Type, Ruimte.ruimte_type_id == Ruimte_Type.ruimte_type_id)\
+        .join(Bedrijf, Voorraad_Positie.bedrijf_id == Bedrijf.bedrijf_id)\
+        .filter(Voorraad_Positie.bedrijf_id == bedrijf_id)
+
 @app.route('/assistent/kanban/aanvragen/enkel/<int:voorraad_positie_id>', methods=['POST'])
 def kanban_aanvragen_enkel(voorraad_positie_id):
     if not check_db():
         return redirect(url_for('dashboard'))
     bedrijf_id = get_huidig_bedrijf_id()
     try:
-        result = db.session.query(Voorraad_Positie, Lokaal_Artikel, Global_Catalogus, Kast, Ruimte, Ruimte_Type, Bedrijf)\
-            .join(Lokaal_Artikel, Voorraad_Positie.lokaal_artikel_id == Lokaal_Artikel.lokaal_artikel_id)\
-            .outerjoin(Global_Catalogus, Lokaal_Artikel.global_id == Global_Catalogus.global_id)\
-            .join(Kast, Voorraad_Positie.kast_id == Kast.kast_id)\
-            .join(Ruimte, Kast.ruimte_id == Ruimte.ruimte_id)\
-            .outerjoin(Ruimte_Type, Ruimte.ruimte_type_id == Ruimte_Type.ruimte_type_id)\
-            .join(Bedrijf, Voorraad_Positie.bedrijf_id == Bedrijf.bedrijf_id)\
-            .filter(
-                Voorraad_Positie.voorraad_positie_id == voorraad_positie_id,
-                Voorraad_Positie.bedrijf_id == bedrijf_id
-            ).first()
+        result = _kanban_aanvraag_query(bedrijf_id)\
+            .filter(Voorraad_Positie.voorraad_positie_id == voorraad_positie_id).first()
 
         if not result:
             flash("Artikel niet gevonden.", "danger")
@@ -854,7 +2315,11 @@ def kanban_aanvragen_enkel(voorraad_positie_id):
 
         queue_item = create_queue_item(*result)
         db.session.add(queue_item)
+        db.session.flush()
+        print_id = queue_item.print_id
         db.session.commit()
+        bump_tenant_context('print_queue', bedrijf_id)
+        schedule_print_payload_build([print_id])
         
         flash("Kanban kaartje aangevraagd!", "success")
     except Exception as e:
@@ -864,49 +2329,56 @@ def kanban_aanvragen_enkel(voorraad_positie_id):
         
     return redirect(request.referrer)
 
-@app.route('/assistent/kanban/aanvragen/kast/<int:kast_id>', methods=['POST'])
-def kanban_aanvragen_kast(kast_id):
-    if not check_db():
-        return redirect(url_for('dashboard'))
-    bedrijf_id = get_huidig_bedrijf_id()
+def _kanban_aanvragen_bulk(bedrijf_id, scope_filter, leeg_melding, omschrijving):
     try:
-        results = db.session.query(Voorraad_Positie, Lokaal_Artikel, Global_Catalogus, Kast, Ruimte, Ruimte_Type, Bedrijf)\
-            .join(Lokaal_Artikel, Voorraad_Positie.lokaal_artikel_id == Lokaal_Artikel.lokaal_artikel_id)\
-            .outerjoin(Global_Catalogus, Lokaal_Artikel.global_id == Global_Catalogus.global_id)\
-            .join(Kast, Voorraad_Positie.kast_id == Kast.kast_id)\
-            .join(Ruimte, Kast.ruimte_id == Ruimte.ruimte_id)\
-            .outerjoin(Ruimte_Type, Ruimte.ruimte_type_id == Ruimte_Type.ruimte_type_id)\
-            .join(Bedrijf, Voorraad_Positie.bedrijf_id == Bedrijf.bedrijf_id)\
-            .filter(Voorraad_Positie.kast_id == kast_id, Voorraad_Positie.bedrijf_id == bedrijf_id).all()
-
+        results = _kanban_aanvraag_query(bedrijf_id).filter(scope_filter).all()
         if not results:
-            flash("Deze kast is leeg.", "warning")
+            flash(leeg_melding, "warning")
             return redirect(request.referrer)
 
-        count = 0
-        for row in results:
-            queue_item = create_queue_item(*row)
-            db.session.add(queue_item)
-            count += 1
-            
+        print_ids = create_queue_items_bulk(results)
         db.session.commit()
-        flash(f"{count} kaartjes aangevraagd voor kast!", "success")
-        
+        bump_tenant_context('print_queue', bedrijf_id)
+        schedule_print_payload_build(print_ids)
+        flash(f"{len(results)} kaartjes aangevraagd voor {omschrijving}!", "success")
     except Exception as e:
         db.session.rollback()
         flash(f"Fout bij batch aanvraag: {e}", "danger")
 
     return redirect(request.referrer)
 
+@app.route('/assistent/kanban/aanvragen/kast/<int:kast_id>', methods=['POST'])
+def kanban_aanvragen_kast(kast_id):
+    if not check_db():
+        return redirect(url_for('dashboard'))
+    bedrijf_id = get_huidig_bedrijf_id()
+    return _kanban_aanvragen_bulk(bedrijf_id, Kast.kast_id == kast_id, "Deze kast is leeg.", "kast")
+
+@app.route('/assistent/kanban/aanvragen/ruimte/<int:ruimte_id>', methods=['POST'])
+def kanban_aanvragen_ruimte(ruimte_id):
+    if not check_db():
+        return redirect(url_for('dashboard'))
+    bedrijf_id = get_huidig_bedrijf_id()
+    return _kanban_aanvragen_bulk(bedrijf_id, Ruimte.ruimte_id == ruimte_id, "Deze ruimte heeft geen artikelen.", "ruimte")
+
+@app.route('/assistent/kanban/aanvragen/vestiging/<int:vestiging_id>', methods=['POST'])
+def kanban_aanvragen_vestiging(vestiging_id):
+    if not check_db():
+        return redirect(url_for('dashboard'))
+    bedrijf_id = get_huidig_bedrijf_id()
+    return _kanban_aanvragen_bulk(bedrijf_id, Ruimte.vestiging_id == vestiging_id, "Deze vestiging heeft geen artikelen.", "vestiging")
+
 @app.route('/assistent/print-queue')
 def assistent_print_queue():
     if not check_db(): return redirect(url_for('dashboard'))
     bedrijf_id = get_huidig_bedrijf_id()
     preview_layout_warning = None
     preview_layout_error = None
-    
-    queue_items = db.session.query(Print_Queue)\
-        .filter(Print_Queue.bedrijf_id == bedrijf_id, Print_Queue.status == 'PENDING')\
+
+    release_stale_print_jobs(bedrijf_id)
+    # payload_json bevat de volledige printpayload incl. base64-afbeeldingen; de lijst heeft hem niet nodig.
+    queue_items = db.session.query(Print_Queue).options(defer(Print_Queue.payload_json))\
+        .filter(Print_Queue.bedrijf_id == bedrijf_id, Print_Queue.status.in_(('PENDING', 'QUEUED', 'SENDING')))\
         .order_by(Print_Queue.aangemaakt_op.desc()).all()
 
     try:
@@ -943,19 +2415,120 @@ def api_preview_layout():
             "error": str(exc)
         }), 503
 
+@app.route('/api/print-image-cache')
+def api_print_image_cache():
+    return jsonify({
+        "ok": True,
+        "stats": get_image_cache_stats()
+    })
+
+
+# Compacte rijen voor scanlijst en kamerlijst: alleen de kolommen die de
+# templates en _group_rows_by_location gebruiken, zonder ORM-identity-map.
+LOCATIE_VELDEN = (
+    'vestiging_id', 'vestiging_naam',
+    'ruimte_type_id', 'ruimte_type_naam', 'ruimte_type_kleur',
+    'ruimte_id', 'ruimte_naam', 'ruimte_nummer',
+    'kast_id', 'kast_naam', 'kast_type_opslag',
+)
+ARTIKEL_VELDEN = (
+    'voorraad_positie_id', 'trigger_min', 'target_max',
+    'lokaal_artikel_id', 'artikel_naam', 'verpakking', 'global_sku', 'image_url',
+)
+ScanlijstRow = namedtuple('ScanlijstRow', (
+    'scanlijst_item_id', 'last_scanned_at', 'scan_count',
+    'product_name', 'product_sku', 'human_code',
+) + ARTIKEL_VELDEN + LOCATIE_VELDEN)
+KamerlijstRow = namedtuple('KamerlijstRow', ARTIKEL_VELDEN + LOCATIE_VELDEN)
 
-def _get_open_scan_rows(bedrijf_id):
-    return db.session.query(
-        KanbanScanlijstItem,
-        KanbanKaart,
-        Voorraad_Positie,
-        Lokaal_Artikel,
-        Global_Catalogus,
-        Kast,
-        Ruimte,
-        Ruimte_Type,
-        Bedrijf,
-        Vestiging
+
+def _optional_column(model, column_name):
+    column = model.__table__.c.get(column_name)
+    return column if column is not None else null()
+
+
+def _artikel_locatie_columns():
+    return (
+        Voorraad_Positie.voorraad_positie_id,
+        Voorraad_Positie.trigger_min,
+        Voorraad_Positie.target_max,
+        Lokaal_Artikel.lokaal_artikel_id,
+        Lokaal_Artikel.eigen_naam,
+        Lokaal_Artikel.verpakkingseenheid_tekst,
+        _optional_column(Global_Catalogus, 'sku'),
+        Voorraad_Positie.locatie_foto_url,
+        Lokaal_Artikel.foto_url,
+        Global_Catalogus.foto_url,
+        Vestiging.vestiging_id,
+        Vestiging.naam,
+        Ruimte_Type.ruimte_type_id,
+        Ruimte_Type.naam,
+        Ruimte_Type.kleur_hex,
+        Ruimte.ruimte_id,
+        Ruimte.naam,
+        Ruimte.nummer,
+        Kast.kast_id,
+        Kast.naam,
+        Kast.type_opslag,
+    )
+
+
+def _compact_values(values):
+    # De drie foto-kolommen worden samengevoegd tot één image_url, in dezelfde
+    # volgorde als voorheen in de templates: positie, lokaal artikel, catalogus.
+    return values[:7] + (values[7] or values[8] or values[9] or None,) + values[10:]
+
+
+SCANLIJST_FILTERS = ('vestiging_id', 'ruimte_type_id', 'ruimte_id')
+
+
+def _scanlijst_filters(args):
+    filters = {}
+    for name in SCANLIJST_FILTERS:
+        value = args.get(name, type=int)
+        if value:
+            filters[name] = value
+    return filters
+
+
+def _encode_scan_cursor(row):
+    return f"{row.last_scanned_at.isoformat()}~{row.scanlijst_item_id}"
+
+
+def _decode_scan_cursor(value):
+    if not value:
+        return None
+    try:
+        timestamp, item_id = value.rsplit('~', 1)
+        return datetime.datetime.fromisoformat(timestamp), int(item_id)
+    except ValueError:
+        return None
+
+
+def _scan_cursor_filter(cursor):
+    last_scanned_at, item_id = cursor
+    # CAST naar het kolomtype: een DATETIME2-parameter is anders nooit gelijk aan
+    # een afgeronde DATETIME-waarde, waardoor rijen met dezelfde tijd wegvallen.
+    cursor_time = cast(literal(last_scanned_at), KanbanScanlijstItem.last_scanned_at.type)
+    return or_(
+        KanbanScanlijstItem.last_scanned_at < cursor_time,
+        and_(
+            KanbanScanlijstItem.last_scanned_at == cursor_time,
+            KanbanScanlijstItem.scanlijst_item_id < item_id
+        )
+    )
+
+
+def _get_open_scan_rows(bedrijf_id, filters=None, cursor=None, limit=None, changed_since=None):
+    """Open scans, nieuwste eerst; keyset-paginering op (last_scanned_at, scanlijst_item_id)."""
+    query = db.session.query(
+        KanbanScanlijstItem.scanlijst_item_id,
+        KanbanScanlijstItem.last_scanned_at,
+        KanbanScanlijstItem.scan_count,
+        KanbanKaart.product_name,
+        KanbanKaart.product_sku,
+        KanbanKaart.human_code,
+        *_artikel_locatie_columns()
     ).join(
         KanbanKaart, KanbanScanlijstItem.kaart_id == KanbanKaart.kaart_id
     ).outerjoin(
@@ -972,30 +2545,65 @@ def _get_open_scan_rows(bedrijf_id):
         Ruimte_Type, Ruimte.ruimte_type_id == Ruimte_Type.ruimte_type_id
     ).outerjoin(
         Vestiging, Ruimte.vestiging_id == Vestiging.vestiging_id
-    ).outerjoin(
-        Bedrijf, KanbanKaart.bedrijf_id == Bedrijf.bedrijf_id
     ).filter(
         KanbanScanlijstItem.bedrijf_id == bedrijf_id,
         KanbanScanlijstItem.reset_at.is_(None)
-    ).order_by(KanbanScanlijstItem.last_scanned_at.desc()).all()
+    )
+    filters = filters or {}
+    if filters.get('vestiging_id'):
+        query = query.filter(Vestiging.vestiging_id == filters['vestiging_id'])
+    if filters.get('ruimte_type_id'):
+        query = query.filter(Ruimte_Type.ruimte_type_id == filters['ruimte_type_id'])
+    if filters.get('ruimte_id'):
+        query = query.filter(Ruimte.ruimte_id == filters['ruimte_id'])
+    if cursor:
+        query = query.filter(_scan_cursor_filter(cursor))
+    if changed_since:
+        query = query.filter(KanbanScanlijstItem.last_scanned_at > changed_since)
+
+    query = query.order_by(
+        KanbanScanlijstItem.last_scanned_at.desc(),
+        KanbanScanlijstItem.scanlijst_item_id.desc()
+    )
+    if limit:
+        query = query.limit(limit)
+    return [ScanlijstRow._make(tuple(row[:6]) + _compact_values(tuple(row[6:]))) for row in query.all()]
+
+
+def _get_open_scan_page(bedrijf_id, filters, cursor=None, limit=SCANLIJST_PAGE_SIZE):
+    """Eén pagina plus de cursor voor de volgende (None als er niets meer is)."""
+    rows = _get_open_scan_rows(bedrijf_id, filters=filters, cursor=cursor, limit=limit + 1)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = _encode_scan_cursor(rows[-1]) if has_more and rows else None
+    return rows, next_cursor
+
 
+def _get_scanlijst_filter_options(bedrijf_id):
+    vestigingen = db.session.query(Vestiging.vestiging_id, Vestiging.naam)\
+        .filter(Vestiging.bedrijf_id == bedrijf_id).order_by(Vestiging.naam).all()
+    ruimte_types = db.session.query(Ruimte_Type.ruimte_type_id, Ruimte_Type.naam)\
+        .filter(Ruimte_Type.bedrijf_id == bedrijf_id).order_by(Ruimte_Type.naam).all()
+    ruimtes = db.session.query(Ruimte.ruimte_id, Ruimte.nummer, Ruimte.naam, Ruimte.vestiging_id)\
+        .filter(Ruimte.bedrijf_id == bedrijf_id).order_by(Ruimte.nummer, Ruimte.naam).all()
+    return {"vestigingen": vestigingen, "ruimte_types": ruimte_types, "ruimtes": ruimtes}
 
-def _group_rows_by_location(rows, row_key, extractor):
+
+def _group_rows_by_location(rows, row_key):
     grouped = []
     vestiging_lookup = {}
 
     for row in rows:
-        vestiging, ruimte_type, ruimte, kast = extractor(row)
-        vestiging_key = vestiging.vestiging_id if vestiging else 'geen-vestiging'
-        ruimte_type_key = ruimte_type.ruimte_type_id if ruimte_type else f"geen-type-{vestiging_key}"
-        ruimte_key = ruimte.ruimte_id if ruimte else f"geen-ruimte-{vestiging_key}"
-        kast_key = kast.kast_id if kast else f"geen-kast-{ruimte_key}"
+        vestiging_key = row.vestiging_id if row.vestiging_id is not None else 'geen-vestiging'
+        ruimte_type_key = row.ruimte_type_id if row.ruimte_type_id is not None else f"geen-type-{vestiging_key}"
+        ruimte_key = row.ruimte_id if row.ruimte_id is not None else f"geen-ruimte-{vestiging_key}"
+        kast_key = row.kast_id if row.kast_id is not None else f"geen-kast-{ruimte_key}"
 
         vestiging_group = vestiging_lookup.get(vestiging_key)
         if not vestiging_group:
             vestiging_group = {
                 "key": vestiging_key,
-                "naam": vestiging.naam if vestiging else "Onbekende vestiging",
+                "naam": row.vestiging_naam if row.vestiging_id is not None else "Onbekende vestiging",
                 "ruimte_types": [],
                 "_ruimte_type_lookup": {}
             }
@@ -1004,10 +2612,11 @@ def _group_rows_by_location(rows, row_key, extractor):
 
         ruimte_type_group = vestiging_group["_ruimte_type_lookup"].get(ruimte_type_key)
         if not ruimte_type_group:
+            heeft_type = row.ruimte_type_id is not None
             ruimte_type_group = {
                 "key": ruimte_type_key,
-                "naam": ruimte_type.naam if ruimte_type else "Geen ruimtetype",
-                "kleur_hex": (ruimte_type.kleur_hex if ruimte_type and ruimte_type.kleur_hex else "#CBD5E1"),
+                "naam": row.ruimte_type_naam if heeft_type else "Geen ruimtetype",
+                "kleur_hex": (row.ruimte_type_kleur if heeft_type and row.ruimte_type_kleur else "#CBD5E1"),
                 "ruimtes": [],
                 "_ruimte_lookup": {}
             }
@@ -1016,10 +2625,11 @@ def _group_rows_by_location(rows, row_key, extractor):
 
         ruimte_group = ruimte_type_group["_ruimte_lookup"].get(ruimte_key)
         if not ruimte_group:
+            heeft_ruimte = row.ruimte_id is not None
             ruimte_group = {
                 "key": ruimte_key,
-                "naam": ruimte.naam if ruimte else "Onbekende ruimte",
-                "nummer": ruimte.nummer if ruimte else None,
+                "naam": row.ruimte_naam if heeft_ruimte else "Onbekende ruimte",
+                "nummer": row.ruimte_nummer if heeft_ruimte else None,
                 "kasten": [],
                 "_kast_lookup": {}
             }
@@ -1028,10 +2638,11 @@ def _group_rows_by_location(rows, row_key, extractor):
 
         kast_group = ruimte_group["_kast_lookup"].get(kast_key)
         if not kast_group:
+            heeft_kast = row.kast_id is not None
             kast_group = {
                 "key": kast_key,
-                "naam": kast.naam if kast else "Onbekende kast",
-                "type_opslag": kast.type_opslag if kast else None,
+                "naam": row.kast_naam if heeft_kast else "Onbekende kast",
+                "type_opslag": row.kast_type_opslag if heeft_kast else None,
                 row_key: []
             }
             ruimte_group["_kast_lookup"][kast_key] = kast_group
@@ -1054,22 +2665,14 @@ def _group_rows_by_location(rows, row_key, extractor):
 
 
 def _group_scan_rows(rows):
-    return _group_rows_by_location(
-        rows,
-        "scan_rows",
-        lambda row: (row[9], row[7], row[6], row[5])
-    )
+    return _group_rows_by_location(rows, "scan_rows")
 
 
 def _get_kamerlijst_rows(bedrijf_id, ruimte_id=None):
     query = db.session.query(
-        Voorraad_Positie,
-        Lokaal_Artikel,
-        Global_Catalogus,
-        Kast,
-        Ruimte,
-        Ruimte_Type,
-        Vestiging
+        *_artikel_locatie_columns()
+    ).select_from(
+        Voorraad_Positie
     ).join(
         Lokaal_Artikel, Voorraad_Positie.lokaal_artikel_id == Lokaal_Artikel.lokaal_artikel_id
     ).outerjoin(
@@ -1089,7 +2692,7 @@ def _get_kamerlijst_rows(bedrijf_id, ruimte_id=None):
     if ruimte_id is not None:
         query = query.filter(Ruimte.ruimte_id == ruimte_id)
 
-    return query.order_by(
+    rows = query.order_by(
         Vestiging.naam,
         Ruimte_Type.naam,
         Ruimte.nummer,
@@ -1097,14 +2700,11 @@ def _get_kamerlijst_rows(bedrijf_id, ruimte_id=None):
         Kast.naam,
         Lokaal_Artikel.eigen_naam
     ).all()
+    return [KamerlijstRow._make(_compact_values(tuple(row))) for row in rows]
 
 
 def _group_kamerlijst_rows(rows):
-    return _group_rows_by_location(
-        rows,
-        "inventory_rows",
-        lambda row: (row[6], row[5], row[4], row[3])
-    )
+    return _group_rows_by_location(rows, "inventory_rows")
 
 
 @app.route('/assistent/scanlijst')
@@ -1112,8 +2712,98 @@ def assistent_scanlijst():
     if not check_db():
         return redirect(url_for('dashboard'))
     bedrijf_id = get_huidig_bedrijf_id()
-    rows = _get_open_scan_rows(bedrijf_id)
-    return render_template('assistent_scanlijst.html', rows=rows, grouped_rows=_group_scan_rows(rows))
+    filters = _scanlijst_filters(request.args)
+    rows, next_cursor = _get_open_scan_page(
+        bedrijf_id, filters, cursor=_decode_scan_cursor(request.args.get('na'))
+    )
+    return render_template(
+        'assistent_scanlijst.html',
+        rows=rows,
+        grouped_rows=_group_scan_rows(rows),
+        filters=filters,
+        filter_options=_get_scanlijst_filter_options(bedrijf_id),
+        next_cursor=next_cursor,
+        changes_cursor=utcnow().isoformat(),
+        poll_interval=SCANLIJST_POLL_INTERVAL
+    )
+
+
+def _scan_row_json(row):
+    return {
+        "scanlijst_item_id": row.scanlijst_item_id,
+        "human_code": row.human_code,
+        "product_name": row.product_name,
+        "product_sku": row.product_sku,
+        "last_scanned_at": row.last_scanned_at.isoformat() if row.last_scanned_at else None,
+        "scan_count": row.scan_count,
+        "vestiging_id": row.vestiging_id,
+        "ruimte_type_id": row.ruimte_type_id,
+        "ruimte_id": row.ruimte_id,
+        "kast_id": row.kast_id
+    }
+
+
+@app.route('/api/scanlijst')
+def api_scanlijst():
+    """Volgende pagina van de scanlijst als JSON, incl. HTML-fragment om samen te voegen."""
+    # Geen check_db(): die flasht een melding die pas bij de volgende pagina verschijnt.
+    if not db_operational:
+        return jsonify({"ok": False, "error": "Geen verbinding met de database."}), 503
+    bedrijf_id = get_huidig_bedrijf_id()
+    cursor_value = request.args.get('na')
+    cursor = _decode_scan_cursor(cursor_value)
+    if cursor_value and not cursor:
+        return jsonify({"ok": False, "error": "Ongeldige cursor."}), 400
+    limit = min(max(request.args.get('limit', SCANLIJST_PAGE_SIZE, type=int), 1), SCANLIJST_PAGE_SIZE * 5)
+    filters = _scanlijst_filters(request.args)
+    rows, next_cursor = _get_open_scan_page(bedrijf_id, filters, cursor=cursor, limit=limit)
+    return jsonify({
+        "ok": True,
+        "items": [_scan_row_json(row) for row in rows],
+        "html": render_template('assistent_scanlijst_groepen.html', grouped_rows=_group_scan_rows(rows), filters=filters),
+        "next_cursor": next_cursor
+    })
+
+
+@app.route('/api/scanlijst/wijzigingen')
+def api_scanlijst_wijzigingen():
+    """Wijzigingen sinds de cursor: nieuwe/opnieuw gescande regels en gereset regels.
+
+    De cursor is de servertijd van de vorige poll. Er wordt SCANLIJST_DELTA_OVERLAP
+    seconden teruggekeken, zodat scans die later binnenkomen dan hun scantijd
+    (spool van de scanfunctie, klokverschil) niet worden gemist. Regels uit dat
+    venster die de pagina al met dezelfde scantijd toont, slaat de client over.
+    Lezen maakt de tenantcache niet ongeldig; dat doen alleen de schrijfpaden.
+    """
+    if not db_operational:
+        return jsonify({"ok": False, "error": "Geen verbinding met de database."}), 503
+    bedrijf_id = get_huidig_bedrijf_id()
+    try:
+        since = datetime.datetime.fromisoformat(request.args.get('sinds', ''))
+    except ValueError:
+        return jsonify({"ok": False, "error": "Ongeldige cursor."}), 400
+
+    polled_at = utcnow()
+    window_start = since - datetime.timedelta(seconds=SCANLIJST_DELTA_OVERLAP)
+    filters = _scanlijst_filters(request.args)
+    limit = SCANLIJST_PAGE_SIZE * 5
+    rows = _get_open_scan_rows(bedrijf_id, filters=filters, limit=limit + 1, changed_since=window_start)
+    removed_ids = [
+        item_id for (item_id,) in db.session.query(KanbanScanlijstItem.scanlijst_item_id).filter(
+            KanbanScanlijstItem.bedrijf_id == bedrijf_id,
+            KanbanScanlijstItem.reset_at > window_start
+        ).all()
+    ]
+    return jsonify({
+        "ok": True,
+        "cursor": polled_at.isoformat(),
+        # Te veel wijzigingen om te patchen: de pagina laadt zichzelf opnieuw.
+        "reload": len(rows) > limit,
+        "items": [_scan_row_json(row) for row in rows[:limit]],
+        "html": render_template('assistent_scanlijst_groepen.html', grouped_rows=_group_scan_rows(rows[:limit]), filters=filters),
+        "removed_ids": removed_ids,
+        "open_scan_count": get_open_scan_count(bedrijf_id)
+    })
 
 
 @app.route('/assistent/scanlijst/print')
@@ -1121,7 +2811,7 @@ def assistent_scanlijst_print():
     if not check_db():
         return redirect(url_for('dashboard'))
     bedrijf_id = get_huidig_bedrijf_id()
-    rows = _get_open_scan_rows(bedrijf_id)
+    rows = _get_open_scan_rows(bedrijf_id, filters=_scanlijst_filters(request.args))
     return render_template(
         'assistent_scanlijst_print.html',
         rows=rows,
@@ -1130,27 +2820,79 @@ def assistent_scanlijst_print():
     )
 
 
+def reset_open_scans(bedrijf_id, reset_by, filters=None, kast_id=None, item_ids=None):
+    """Reset open scans in één UPDATE, optioneel beperkt tot locatie of geselecteerde regels.
+
+    Een selectie gaat per BULK_IN_CHUNK_SIZE ids (SQL Server staat max. 2100
+    parameters toe), binnen dezelfde transactie en met hetzelfde reset-tijdstip.
+    """
+    query = db.session.query(KanbanScanlijstItem).filter(
+        KanbanScanlijstItem.bedrijf_id == bedrijf_id,
+        KanbanScanlijstItem.reset_at.is_(None)
+    )
+
+    filters = filters or {}
+    if filters or kast_id:
+        kaarten = db.session.query(KanbanKaart.kaart_id).join(
+            Voorraad_Positie, KanbanKaart.voorraad_positie_id == Voorraad_Positie.voorraad_positie_id
+        ).join(
+            Kast, Voorraad_Positie.kast_id == Kast.kast_id
+        ).join(
+            Ruimte, Kast.ruimte_id == Ruimte.ruimte_id
+        ).filter(KanbanKaart.bedrijf_id == bedrijf_id)
+        if filters.get('vestiging_id'):
+            kaarten = kaarten.filter(Ruimte.vestiging_id == filters['vestiging_id'])
+        if filters.get('ruimte_type_id'):
+            kaarten = kaarten.filter(Ruimte.ruimte_type_id == filters['ruimte_type_id'])
+        if filters.get('ruimte_id'):
+            kaarten = kaarten.filter(Ruimte.ruimte_id == filters['ruimte_id'])
+        if kast_id:
+            kaarten = kaarten.filter(Kast.kast_id == kast_id)
+        query = query.filter(KanbanScanlijstItem.kaart_id.in_(kaarten.scalar_subquery()))
+
+    values = {
+        KanbanScanlijstItem.reset_at: utcnow(),
+        KanbanScanlijstItem.reset_by: reset_by
+    }
+    if item_ids:
+        count = sum(
+            query.filter(KanbanScanlijstItem.scanlijst_item_id.in_(chunk)).update(values, synchronize_session=False)
+            for chunk in _chunked(item_ids)
+        )
+    else:
+        count = query.update(values, synchronize_session=False)
+    db.session.commit()
+    if count:
+        bump_tenant_context('open_scans', bedrijf_id)
+    return count
+
+
 @app.route('/assistent/scanlijst/reset', methods=['POST'])
 def assistent_scanlijst_reset():
     if not check_db():
         return redirect(url_for('dashboard'))
     bedrijf_id = get_huidig_bedrijf_id()
-    rows = db.session.query(KanbanScanlijstItem).filter(
-        KanbanScanlijstItem.bedrijf_id == bedrijf_id,
-        KanbanScanlijstItem.reset_at.is_(None)
-    ).all()
-    if not rows:
-        flash('Geen openstaande scans om te resetten.', 'info')
-        return redirect(url_for('assistent_scanlijst'))
+    filters = _scanlijst_filters(request.form)
+    kast_id = request.form.get('kast_id', type=int)
+    item_ids = [item_id for item_id in request.form.getlist('item_ids', type=int) if item_id]
+    if request.form.get('scope') == 'selectie' and not item_ids:
+        flash('Selecteer eerst een of meer scans om te resetten.', 'warning')
+        return redirect(url_for('assistent_scanlijst', **filters))
 
-    reset_at = utcnow()
-    reset_by = _get_reset_actor()
-    for row in rows:
-        row.reset_at = reset_at
-        row.reset_by = reset_by
-    db.session.commit()
-    flash(f'{len(rows)} scan(s) gereset.', 'success')
-    return redirect(url_for('assistent_scanlijst'))
+    try:
+        count = reset_open_scans(
+            bedrijf_id, _get_reset_actor(), filters=filters, kast_id=kast_id, item_ids=item_ids
+        )
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Resetten mislukt: {e}', 'danger')
+        return redirect(url_for('assistent_scanlijst', **filters))
+
+    if not count:
+        flash('Geen openstaande scans om te resetten.', 'info')
+    else:
+        flash(f'{count} scan(s) gereset.', 'success')
+    return redirect(url_for('assistent_scanlijst', **filters))
 
 
 @app.route('/assistent/kamerlijst')
@@ -1188,7 +2930,7 @@ def assistent_kamerlijst_print(ruimte_id):
 def test_print_verbinding():
     if not check_db():
         return redirect(url_for('dashboard'))
-    ok, detail = test_print_service_connectivity()
+    ok, detail = test_print_service_connectivity(force=True)
     if ok:
         flash(detail, 'success')
     else:
@@ -1201,13 +2943,11 @@ def verstuur_print_opdracht(print_id):
         return redirect(url_for('dashboard'))
     bedrijf_id = get_huidig_bedrijf_id()
 
-    item = db.session.query(Print_Queue).filter(
-        Print_Queue.print_id == print_id,
-        Print_Queue.bedrijf_id == bedrijf_id,
-        Print_Queue.status == 'PENDING'
-    ).first()
-    if not item:
-        flash("Printopdracht niet gevonden of al verwerkt.", "warning")
+    if PRINT_DISPATCH_MODE == 'worker':
+        if enqueue_print_jobs(bedrijf_id, print_id=print_id):
+            flash("Kaartje klaargezet voor de printworker.", "success")
+        else:
+            flash("Printopdracht niet gevonden of al verwerkt.", "warning")
         return redirect(url_for('assistent_print_queue'))
 
     ok, detail = test_print_service_connectivity()
@@ -1215,14 +2955,17 @@ def verstuur_print_opdracht(print_id):
         flash(detail, 'danger')
         return redirect(url_for('assistent_print_queue'))
 
-    sent, error_msg = send_queue_item_to_print_service(item)
-    if sent:
-        _mark_card_printed(item)
-        db.session.delete(item)
-        db.session.commit()
+    release_stale_print_jobs(bedrijf_id)
+    claimed_ids = claim_print_jobs('PENDING', 1, bedrijf_id=bedrijf_id, print_id=print_id)
+    if not claimed_ids:
+        flash("Printopdracht niet gevonden of al verwerkt.", "warning")
+        return redirect(url_for('assistent_print_queue'))
+
+    results = dispatch_claimed_print_jobs(claimed_ids)
+    if results and results[0]["ok"]:
         flash("Kaartje naar lokale printer gestuurd.", "success")
     else:
-        flash(error_msg, "danger")
+        flash(results[0]["error"] if results else "Printopdracht niet gevonden of al verwerkt.", "danger")
     return redirect(url_for('assistent_print_queue'))
 
 @app.route('/assistent/print-queue/verstuur-alles', methods=['POST'])
@@ -1230,14 +2973,16 @@ def verstuur_alle_print_opdrachten():
     if not check_db():
         return redirect(url_for('dashboard'))
     bedrijf_id = get_huidig_bedrijf_id()
-
-    items = db.session.query(Print_Queue).filter(
-        Print_Queue.bedrijf_id == bedrijf_id,
-        Print_Queue.status == 'PENDING'
-    ).order_by(Print_Queue.aangemaakt_op.asc()).all()
-
-    if not items:
-        flash("Geen openstaande printopdrachten.", "info")
+    wants_json = request.args.get('format') == 'json'
+
+    if PRINT_DISPATCH_MODE == 'worker':
+        queued = enqueue_print_jobs(bedrijf_id)
+        if wants_json:
+            return jsonify({"ok": True, "queued": queued, "results": []})
+        if queued:
+            flash(f"{queued} kaartje(s) klaargezet voor de printworker.", "success")
+        else:
+            flash("Geen openstaande printopdrachten.", "info")
         return redirect(url_for('assistent_print_queue'))
 
     ok, detail = test_print_service_connectivity()
@@ -1245,28 +2990,33 @@ def verstuur_alle_print_opdrachten():
         flash(detail, 'danger')
         return redirect(url_for('assistent_print_queue'))
 
-    success_count = 0
-    fail_count = 0
-    fail_messages = []
+    release_stale_print_jobs(bedrijf_id)
+    pending_count = db.session.query(Print_Queue).filter(
+        Print_Queue.bedrijf_id == bedrijf_id,
+        Print_Queue.status == 'PENDING'
+    ).count()
+    claimed_ids = claim_print_jobs('PENDING', pending_count, bedrijf_id=bedrijf_id) if pending_count else []
+    if not claimed_ids:
+        flash("Geen openstaande printopdrachten.", "info")
+        return redirect(url_for('assistent_print_queue'))
 
-    for item in items:
-        sent, error_msg = send_queue_item_to_print_service(item)
-        if sent:
-            _mark_card_printed(item)
-            db.session.delete(item)
-            success_count += 1
-        else:
-            fail_count += 1
-            if len(fail_messages) < 3:
-                fail_messages.append(f"ID {item.print_id}: {error_msg}")
+    results = dispatch_claimed_print_jobs(claimed_ids)
+    success_count = sum(1 for result in results if result["ok"])
+    failed = [result for result in results if not result["ok"]]
 
-    db.session.commit()
+    if wants_json:
+        return jsonify({
+            "ok": not failed,
+            "sent": success_count,
+            "failed": len(failed),
+            "results": results
+        })
 
     if success_count:
         flash(f"{success_count} kaartje(s) verstuurd naar lokale printer.", "success")
-    if fail_count:
-        extra = " | ".join(fail_messages)
-        flash(f"{fail_count} opdracht(en) mislukt. {extra}", "danger")
+    if failed:
+        extra = " | ".join(f"ID {result['print_id']}: {result['error']}" for result in failed[:3])
+        flash(f"{len(failed)} opdracht(en) mislukt. {extra}", "danger")
     return redirect(url_for('assistent_print_queue'))
 
 @app.route('/assistent/print-queue/annuleren/<int:print_id>', methods=['POST'])
@@ -1282,6 +3032,7 @@ def annuleren_print_opdracht(print_id):
         _mark_card_cancelled(item)
         db.session.delete(item)
         db.session.commit()
+        bump_tenant_context('print_queue', bedrijf_id)
         flash("Aanvraag geannuleerd.", "info")
     return redirect(url_for('assistent_print_queue'))
 
@@ -1314,6 +3065,7 @@ def artikelen_beheer():
             artikel_id = request.form.get('artikel_id', type=int)
             artikel = get_scoped_item(Lokaal_Artikel, artikel_id, bedrijf_id)
             if artikel:
+                oude_foto_url = artikel.foto_url
                 artikel.eigen_naam = request.form.get('naam')
                 artikel.verpakkingseenheid_tekst = request.form.get('eenheid')
                 file = request.files.get('afbeelding')
@@ -1321,50 +3073,171 @@ def artikelen_beheer():
                     url = upload_image_to_azure(file)
                     if url and "ERROR" not in url: artikel.foto_url = url
                 db.session.commit()
+                if artikel.foto_url != oude_foto_url:
+                    global_item = db.session.query(Global_Catalogus).filter(Global_Catalogus.global_id == artikel.global_id).first() if artikel.global_id else None
+                    vorige_urls = [url for url in (oude_foto_url, global_item.foto_url if global_item else None) if url]
+                    refresh_queued_print_images(
+                        'product_image_url',
+                        artikel.foto_url,
+                        lambda column: or_(column.is_(None), column.in_(vorige_urls)) if not oude_foto_url else column == oude_foto_url,
+                        Print_Queue.bedrijf_id == bedrijf_id,
+                        Print_Queue.product_sku == str(artikel.lokaal_artikel_id)
+                    )
                 flash('Artikel bijgewerkt.', 'success')
         return redirect(url_for('artikelen_beheer'))
 
     raw_results = db.session.query(Lokaal_Artikel, Global_Catalogus).outerjoin(Global_Catalogus, Lokaal_Artikel.global_id == Global_Catalogus.global_id).filter(Lokaal_Artikel.bedrijf_id == bedrijf_id).order_by(Lokaal_Artikel.eigen_naam).all()
     view_data = [{'obj': l, 'display_naam': l.eigen_naam, 'display_foto': l.foto_url or (g.foto_url if g else None), 'is_globaal': g is not None, 'is_afwijkend': g and l.eigen_naam != g.generieke_naam, 'oorsprong_naam': g.generieke_naam if g else None} for l, g in raw_results]
-    linked_ids = db.session.query(Lokaal_Artikel.global_id).filter(Lokaal_Artikel.bedrijf_id == bedrijf_id, Lokaal_Artikel.global_id.isnot(None))
-    beschikbare_globals = db.session.query(Global_Catalogus).filter(Global_Catalogus.global_id.notin_(linked_ids)).all()
-    return render_template('artikelen_beheer.html', artikelen=view_data, beschikbare_globals=beschikbare_globals)
+    return render_template('artikelen_beheer.html', artikelen=view_data)
+
+def _vervang_bron_ids(bedrijf_id, form):
+    """Bronartikelen uit het formulier (één of meer), beperkt tot het huidige bedrijf."""
+    ids = {artikel_id for artikel_id in form.getlist('oud_lokaal_ids', type=int) if artikel_id}
+    enkel_id = form.get('oud_lokaal_id', type=int)
+    if enkel_id:
+        ids.add(enkel_id)
+    if not ids:
+        return []
+    return [
+        artikel_id for (artikel_id,) in db.session.query(Lokaal_Artikel.lokaal_artikel_id).filter(
+            Lokaal_Artikel.bedrijf_id == bedrijf_id,
+            Lokaal_Artikel.lokaal_artikel_id.in_(ids)
+        )
+    ]
+
+def _vervang_conflict(bedrijf_id, bron_ids, doel_id):
+    """Waar voor posities die na vervangen dubbel in hun kast zouden liggen.
+
+    Dat is zo als het doelartikel al in dezelfde kast ligt, of als een ander
+    bronartikel daar met een lager positie-id ligt (die blijft dan staan).
+    """
+    andere = aliased(Voorraad_Positie)
+    doel_in_kast = db.select(andere.voorraad_positie_id).where(
+        andere.bedrijf_id == bedrijf_id,
+        andere.kast_id == Voorraad_Positie.kast_id,
+        andere.lokaal_artikel_id == doel_id
+    ).exists()
+    eerdere_bron = db.select(andere.voorraad_positie_id).where(
+        andere.bedrijf_id == bedrijf_id,
+        andere.kast_id == Voorraad_Positie.kast_id,
+        andere.lokaal_artikel_id.in_(bron_ids),
+        andere.voorraad_positie_id < Voorraad_Positie.voorraad_positie_id
+    ).exists()
+    return or_(doel_in_kast, eerdere_bron)
+
+def vervang_posities(bedrijf_id, bron_ids, doel_id):
+    """Zet posities van bron_ids om naar doel_id: één DELETE voor dubbelen, één UPDATE voor de rest."""
+    bron_posities = db.session.query(Voorraad_Positie).filter(
+        Voorraad_Positie.bedrijf_id == bedrijf_id,
+        Voorraad_Positie.lokaal_artikel_id.in_(bron_ids)
+    )
+    verwijderd = bron_posities.filter(_vervang_conflict(bedrijf_id, bron_ids, doel_id))\
+        .delete(synchronize_session=False)
+    bijgewerkt = bron_posities.update({Voorraad_Positie.lokaal_artikel_id: doel_id}, synchronize_session=False)
+    return bijgewerkt, verwijderd
+
+def vervang_voorbeeld(bedrijf_id, bron_ids, doel_id):
+    """Per ruimte hoeveel posities worden omgezet en hoeveel als dubbel verdwijnen."""
+    conflict = case((_vervang_conflict(bedrijf_id, bron_ids, doel_id), 1), else_=0)
+    rows = db.session.query(
+        Ruimte.ruimte_id,
+        Ruimte.nummer,
+        Ruimte.naam,
+        func.count(Voorraad_Positie.voorraad_positie_id),
+        func.sum(conflict)
+    ).select_from(Voorraad_Positie).outerjoin(
+        Kast, Voorraad_Positie.kast_id == Kast.kast_id
+    ).outerjoin(
+        Ruimte, Kast.ruimte_id == Ruimte.ruimte_id
+    ).filter(
+        Voorraad_Positie.bedrijf_id == bedrijf_id,
+        Voorraad_Positie.lokaal_artikel_id.in_(bron_ids)
+    ).group_by(Ruimte.ruimte_id, Ruimte.nummer, Ruimte.naam).order_by(Ruimte.nummer, Ruimte.naam).all()
+    return [
+        {
+            "ruimte": f"{nummer} - {naam}" if nummer else (naam or "Onbekende ruimte"),
+            "bijgewerkt": totaal - int(dubbel or 0),
+            "verwijderd": int(dubbel or 0)
+        }
+        for _, nummer, naam, totaal, dubbel in rows
+    ]
+
+def _vervang_doel(bedrijf_id, nieuw_global_id):
+    """Bestaand lokaal artikel voor het catalogus-item, of (None, catalogus-item) als het nog moet worden gemaakt."""
+    bestaand_doel = db.session.query(Lokaal_Artikel).filter_by(bedrijf_id=bedrijf_id, global_id=nieuw_global_id).first()
+    if bestaand_doel:
+        return bestaand_doel, None
+    g_item = db.session.query(Global_Catalogus).filter(Global_Catalogus.global_id == nieuw_global_id).first()
+    return None, g_item
 
 @app.route('/artikelen-beheer/vervang', methods=['POST'])
 def vervang_artikel():
     if not check_db(): return redirect(url_for('dashboard'))
     bedrijf_id = get_huidig_bedrijf_id()
-    oud_lokaal_id = request.form.get('oud_lokaal_id', type=int)
     nieuw_global_id = request.form.get('nieuw_global_id', type=int)
-    
-    oud_artikel = get_scoped_item(Lokaal_Artikel, oud_lokaal_id, bedrijf_id)
-    if not oud_artikel:
+    bron_ids = _vervang_bron_ids(bedrijf_id, request.form)
+    if not bron_ids:
         flash('Bronartikel niet gevonden of geen toegang.', 'warning')
         return redirect(url_for('artikelen_beheer'))
 
-    bestaand_doel = db.session.query(Lokaal_Artikel).filter_by(bedrijf_id=bedrijf_id, global_id=nieuw_global_id).first()
-    
-    if bestaand_doel: doel_id = bestaand_doel.lokaal_artikel_id
-    else:
-        g_item = db.session.query(Global_Catalogus).filter(Global_Catalogus.global_id == nieuw_global_id).first()
-        if not g_item:
-            flash('Doelartikel uit catalogus niet gevonden.', 'warning')
-            return redirect(url_for('artikelen_beheer'))
-        nieuw = Lokaal_Artikel(bedrijf_id=bedrijf_id, global_id=nieuw_global_id, eigen_naam=g_item.generieke_naam, verpakkingseenheid_tekst=oud_artikel.verpakkingseenheid_tekst)
-        db.session.add(nieuw)
-        db.session.flush()
-        doel_id = nieuw.lokaal_artikel_id
+    bestaand_doel, g_item = _vervang_doel(bedrijf_id, nieuw_global_id)
+    if not bestaand_doel and not g_item:
+        flash('Doelartikel uit catalogus niet gevonden.', 'warning')
+        return redirect(url_for('artikelen_beheer'))
 
-    posities = db.session.query(Voorraad_Positie).filter_by(bedrijf_id=bedrijf_id, lokaal_artikel_id=oud_lokaal_id).all()
-    for pos in posities:
-        if db.session.query(Voorraad_Positie).filter_by(bedrijf_id=bedrijf_id, kast_id=pos.kast_id, lokaal_artikel_id=doel_id).first(): db.session.delete(pos)
-        else: pos.lokaal_artikel_id = doel_id
-    
-    if oud_artikel: db.session.delete(oud_artikel)
-    db.session.commit()
-    flash('Artikel vervangen.', 'success')
+    try:
+        if bestaand_doel:
+            doel_id = bestaand_doel.lokaal_artikel_id
+        else:
+            eerste_bron = db.session.get(Lokaal_Artikel, bron_ids[0])
+            nieuw = Lokaal_Artikel(bedrijf_id=bedrijf_id, global_id=nieuw_global_id, eigen_naam=g_item.generieke_naam, verpakkingseenheid_tekst=eerste_bron.verpakkingseenheid_tekst)
+            db.session.add(nieuw)
+            db.session.flush()
+            doel_id = nieuw.lokaal_artikel_id
+
+        # Het doelartikel zelf kan als bron zijn aangevinkt; dat blijft gewoon staan.
+        bron_ids = [artikel_id for artikel_id in bron_ids if artikel_id != doel_id]
+        bijgewerkt = verwijderd = 0
+        if bron_ids:
+            bijgewerkt, verwijderd = vervang_posities(bedrijf_id, bron_ids, doel_id)
+            db.session.query(Lokaal_Artikel).filter(
+                Lokaal_Artikel.bedrijf_id == bedrijf_id,
+                Lokaal_Artikel.lokaal_artikel_id.in_(bron_ids)
+            ).delete(synchronize_session=False)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Vervangen mislukt: {e}', 'danger')
+        return redirect(url_for('artikelen_beheer'))
+
+    flash(f'{len(bron_ids)} artikel(en) vervangen: {bijgewerkt} positie(s) omgezet, {verwijderd} dubbele verwijderd.', 'success')
     return redirect(url_for('artikelen_beheer'))
 
+@app.route('/artikelen-beheer/vervang/voorbeeld', methods=['POST'])
+def vervang_artikel_voorbeeld():
+    if not check_db():
+        return jsonify({"ok": False, "error": "Geen verbinding met de database."}), 503
+    bedrijf_id = get_huidig_bedrijf_id()
+    bron_ids = _vervang_bron_ids(bedrijf_id, request.form)
+    if not bron_ids:
+        return jsonify({"ok": False, "error": "Bronartikel niet gevonden of geen toegang."}), 404
+    bestaand_doel, g_item = _vervang_doel(bedrijf_id, request.form.get('nieuw_global_id', type=int))
+    if not bestaand_doel and not g_item:
+        return jsonify({"ok": False, "error": "Doelartikel uit catalogus niet gevonden."}), 404
+
+    # Zonder bestaand doelartikel kan niets met het doel botsen; -1 matcht geen enkele positie.
+    doel_id = bestaand_doel.lokaal_artikel_id if bestaand_doel else -1
+    bron_ids = [artikel_id for artikel_id in bron_ids if artikel_id != doel_id]
+    per_ruimte = vervang_voorbeeld(bedrijf_id, bron_ids, doel_id) if bron_ids else []
+    return jsonify({
+        "ok": True,
+        "artikelen": len(bron_ids),
+        "nieuw_lokaal_artikel": bestaand_doel is None,
+        "per_ruimte": per_ruimte,
+        "bijgewerkt": sum(item["bijgewerkt"] for item in per_ruimte),
+        "verwijderd": sum(item["verwijderd"] for item in per_ruimte)
+    })
+
 @app.route('/api/artikel-gebruik/<int:artikel_id>')
 def api_artikel_gebruik(artikel_id):
     if not check_db():
@@ -1383,6 +3256,73 @@ def api_artikel_gebruik(artikel_id):
         ).all()
     return jsonify([{'ruimte': r.naam, 'kast': k.naam, 'min': p.trigger_min, 'max': p.target_max} for p, k, r in posities])
 
+@app.route('/api/ean/<code>')
+def api_ean_resolve(code):
+    """Barcode -> catalogus-item -> lokale artikelen van het bedrijf -> hun posities."""
+    if not db_operational:
+        return jsonify({"ok": False, "error": "Geen verbinding met de database."}), 503
+    bedrijf_id = get_huidig_bedrijf_id()
+    items = zoek_ean(code)
+    if not items:
+        return jsonify({"ok": False, "error": "Onbekende EAN.", "ean": code}), 404
+
+    rows = db.session.query(
+        Lokaal_Artikel.lokaal_artikel_id,
+        Lokaal_Artikel.global_id,
+        Lokaal_Artikel.eigen_naam,
+        Lokaal_Artikel.verpakkingseenheid_tekst,
+        Voorraad_Positie.voorraad_positie_id,
+        Voorraad_Positie.trigger_min,
+        Voorraad_Positie.target_max,
+        Kast.kast_id,
+        Kast.naam.label('kast_naam'),
+        Ruimte.ruimte_id,
+        Ruimte.nummer.label('ruimte_nummer'),
+        Ruimte.naam.label('ruimte_naam')
+    ).outerjoin(
+        Voorraad_Positie, and_(
+            Voorraad_Positie.lokaal_artikel_id == Lokaal_Artikel.lokaal_artikel_id,
+            Voorraad_Positie.bedrijf_id == bedrijf_id
+        )
+    ).outerjoin(
+        Kast, Voorraad_Positie.kast_id == Kast.kast_id
+    ).outerjoin(
+        Ruimte, Kast.ruimte_id == Ruimte.ruimte_id
+    ).filter(
+        Lokaal_Artikel.bedrijf_id == bedrijf_id,
+        Lokaal_Artikel.global_id.in_([item.global_id for item in items])
+    ).order_by(Lokaal_Artikel.lokaal_artikel_id, Ruimte.nummer, Ruimte.naam, Kast.naam).all()
+
+    artikelen = OrderedDict()
+    for row in rows:
+        artikel = artikelen.setdefault(row.lokaal_artikel_id, {
+            "id": row.lokaal_artikel_id,
+            "global_id": row.global_id,
+            "naam": row.eigen_naam,
+            "verpakking": row.verpakkingseenheid_tekst,
+            "posities": []
+        })
+        if row.voorraad_positie_id is not None:
+            artikel["posities"].append({
+                "id": row.voorraad_positie_id,
+                "min": row.trigger_min,
+                "max": row.target_max,
+                "kast_id": row.kast_id,
+                "kast": row.kast_naam,
+                "ruimte_id": row.ruimte_id,
+                "ruimte": f"{row.ruimte_nummer} - {row.ruimte_naam}" if row.ruimte_nummer else row.ruimte_naam,
+                "url": url_for('assistent_kamer_view', ruimte_id=row.ruimte_id) if row.ruimte_id else None
+            })
+    return jsonify({
+        "ok": True,
+        "ean": code,
+        "catalogus": [
+            {"id": item.global_id, "naam": item.generieke_naam, "ean": item.ean_code, "categorie": item.categorie, "foto_url": item.foto_url}
+            for item in items
+        ],
+        "artikelen": list(artikelen.values())
+    })
+
 @app.route('/beheer/catalogus', methods=['GET', 'POST'])
 def beheer_catalogus():
     if not check_db(): return redirect(url_for('dashboard'))
@@ -1397,6 +3337,7 @@ def beheer_catalogus():
                 if url and "ERROR" not in url: nieuw.foto_url = url
             db.session.add(nieuw)
             db.session.commit()
+            catalogus_index_bijwerken(nieuw)
             flash('Global item gemaakt.', 'success')
         elif actie == 'koppel_lokaal':
             global_id = request.form.get('global_id', type=int)
@@ -1411,6 +3352,7 @@ def beheer_catalogus():
             global_id = request.form.get('global_id', type=int)
             item = db.session.query(Global_Catalogus).filter(Global_Catalogus.global_id == global_id).first()
             if item:
+                oude_foto_url = item.foto_url
                 item.generieke_naam = request.form.get('naam')
                 item.ean_code = request.form.get('ean')
                 item.categorie = request.form.get('categorie')
@@ -1419,6 +3361,19 @@ def beheer_catalogus():
                     url = upload_image_to_azure(file)
                     if url and "ERROR" not in url: item.foto_url = url
                 db.session.commit()
+                catalogus_index_bijwerken(item)
+                if item.foto_url != oude_foto_url:
+                    # Alleen lokale artikelen zonder eigen foto tonen de catalogusfoto.
+                    zonder_eigen_foto = db.session.query(cast(Lokaal_Artikel.lokaal_artikel_id, db.String(20))).filter(
+                        Lokaal_Artikel.global_id == global_id,
+                        Lokaal_Artikel.foto_url.is_(None)
+                    )
+                    refresh_queued_print_images(
+                        'product_image_url',
+                        item.foto_url,
+                        lambda column: column == oude_foto_url if oude_foto_url else column.is_(None),
+                        Print_Queue.product_sku.in_(zonder_eigen_foto)
+                    )
                 flash('Global item bijgewerkt', 'success')
         elif actie == 'verwijder_global':
             global_id = request.form.get('global_id', type=int)
@@ -1430,31 +3385,112 @@ def beheer_catalogus():
                 if item:
                     db.session.delete(item)
                     db.session.commit()
+                    catalogus_index_verwijderen(global_id)
                     flash('Item verwijderd.', 'success')
         return redirect(url_for('beheer_catalogus'))
 
-    globals = db.session.query(Global_Catalogus).all()
-    lokale_ids = [a.global_id for a in db.session.query(Lokaal_Artikel.global_id).filter_by(bedrijf_id=bedrijf_id).all()]
-    return render_template('beheer_catalogus.html', globals=globals, lokale_ids=lokale_ids)
+    return render_template('beheer_catalogus.html', catalogus_aantal=catalogus_aantal())
 
 @app.route('/beheer/bedrijf', methods=['GET', 'POST'])
 def beheer_bedrijf():
     if not check_db(): return redirect(url_for('dashboard'))
     bedrijf_id = get_huidig_bedrijf_id()
-    bedrijf = db.session.query(Bedrijf).filter(Bedrijf.bedrijf_id == bedrijf_id).first()
+    bedrijf = get_scoped_item(Bedrijf, bedrijf_id, bedrijf_id)
     if not bedrijf:
         flash('Bedrijf niet gevonden.', 'warning')
         return redirect(url_for('dashboard'))
     if request.method == 'POST':
         bedrijf.naam = request.form.get('naam')
+        oude_logo_url = bedrijf.logo_url
         file = request.files.get('logo')
         if file:
             url = upload_image_to_azure(file)
             if url and "ERROR" not in url: bedrijf.logo_url = url
         db.session.commit()
+        bump_tenant_context('bedrijven')
+        if bedrijf.logo_url != oude_logo_url:
+            refresh_queued_print_images(
+                'company_logo_url',
+                bedrijf.logo_url,
+                lambda column: or_(column.is_(None), column == oude_logo_url),
+                Print_Queue.bedrijf_id == bedrijf_id
+            )
         return redirect(url_for('beheer_bedrijf'))
     return render_template('beheer_bedrijf.html', bedrijf=bedrijf)
 
+RUIMTE_KLOON_MAX = 100
+
+def _ruimte_nummering(patroon, n):
+    """Vult {n} in een naam- of nummerpatroon; zonder patroon blijft de waarde ongewijzigd."""
+    return patroon.replace('{n}', str(n)) if patroon else patroon
+
+def _kast_kloonsleutel(*partition_by):
+    # Kopieën verschillen alleen in kast_id; (naam, type_opslag, volgnummer) wijst
+    # dus altijd een gelijkwaardige kast aan, in welke volgorde de identity ook loopt.
+    naam = func.coalesce(Kast.naam, '')
+    type_opslag = func.coalesce(Kast.type_opslag, '')
+    return (
+        naam.label('naam'),
+        type_opslag.label('type_opslag'),
+        func.row_number().over(partition_by=[*partition_by, naam, type_opslag], order_by=Kast.kast_id).label('volgnummer'),
+    )
+
+def kloon_ruimte_inhoud(bedrijf_id, bron_ruimte_id, doel_ruimte_ids):
+    """Kopieert kasten en posities van een sjabloonruimte naar de doelruimtes met set-operaties.
+
+    Kasten gaan met één INSERT ... SELECT naar alle doelruimtes tegelijk. Posities
+    volgen met één INSERT ... SELECT waarin bron- en nieuwe kasten op naam,
+    type_opslag en volgnummer binnen die combinatie worden gekoppeld; qr_code
+    wordt daarna met één UPDATE gevuld. Commit is aan de aanroeper.
+    """
+    if not doel_ruimte_ids:
+        return 0, 0
+    bron = aliased(Kast)
+    doel = aliased(Ruimte)
+    kasten = db.session.execute(
+        sqlalchemy.insert(Kast).from_select(
+            ['bedrijf_id', 'ruimte_id', 'naam', 'type_opslag'],
+            db.select(bron.bedrijf_id, doel.ruimte_id, bron.naam, bron.type_opslag)
+            .join(doel, doel.ruimte_id.in_(doel_ruimte_ids))
+            .where(bron.ruimte_id == bron_ruimte_id, bron.bedrijf_id == bedrijf_id)
+        )
+    ).rowcount
+
+    bron_kasten = db.select(Kast.kast_id, *_kast_kloonsleutel()).where(
+        Kast.ruimte_id == bron_ruimte_id, Kast.bedrijf_id == bedrijf_id
+    ).subquery()
+    nieuwe_kasten = db.select(Kast.kast_id, *_kast_kloonsleutel(Kast.ruimte_id)).where(
+        Kast.ruimte_id.in_(doel_ruimte_ids), Kast.bedrijf_id == bedrijf_id
+    ).subquery()
+    posities = db.session.execute(
+        sqlalchemy.insert(Voorraad_Positie).from_select(
+            ['bedrijf_id', 'kast_id', 'lokaal_artikel_id', 'strategie', 'trigger_min', 'target_max', 'locatie_foto_url'],
+            db.select(
+                Voorraad_Positie.bedrijf_id, nieuwe_kasten.c.kast_id, Voorraad_Positie.lokaal_artikel_id,
+                Voorraad_Positie.strategie, Voorraad_Positie.trigger_min, Voorraad_Positie.target_max,
+                Voorraad_Positie.locatie_foto_url
+            ).join(bron_kasten, Voorraad_Positie.kast_id == bron_kasten.c.kast_id)
+            .join(nieuwe_kasten, and_(
+                nieuwe_kasten.c.naam == bron_kasten.c.naam,
+                nieuwe_kasten.c.type_opslag == bron_kasten.c.type_opslag,
+                nieuwe_kasten.c.volgnummer == bron_kasten.c.volgnummer
+            ))
+            .where(Voorraad_Positie.bedrijf_id == bedrijf_id)
+        )
+    ).rowcount
+
+    db.session.query(Voorraad_Positie).filter(
+        Voorraad_Positie.bedrijf_id == bedrijf_id,
+        Voorraad_Positie.qr_code.is_(None),
+        Voorraad_Positie.kast_id.in_(
+            db.select(Kast.kast_id).where(Kast.ruimte_id.in_(doel_ruimte_ids), Kast.bedrijf_id == bedrijf_id)
+        )
+    ).update(
+        {Voorraad_Positie.qr_code: literal(f"{API_BASE_URL}/") + cast(Voorraad_Positie.voorraad_positie_id, sqlalchemy.String)},
+        synchronize_session=False
+    )
+    return kasten, posities
+
 @app.route('/beheer/infra', methods=['GET', 'POST'])
 def beheer_infra():
     if not check_db(): return redirect(url_for('dashboard'))
@@ -1477,26 +3513,24 @@ def beheer_infra():
                 if not vestiging:
                     flash('Vestiging niet gevonden of geen toegang.', 'warning')
                     return redirect(url_for('beheer_infra'))
-                nieuwe_ruimte = Ruimte(bedrijf_id=bedrijf_id, vestiging_id=vest_id, naam=request.form.get('naam'), nummer=request.form.get('nummer'), ruimte_type_id=request.form.get('ruimte_type_id'), type_ruimte='KAMER')
-                db.session.add(nieuwe_ruimte)
+                aantal = min(max(request.form.get('aantal', 1, type=int) or 1, 1), RUIMTE_KLOON_MAX)
+                start = request.form.get('start_nummer', 1, type=int) or 1
+                naam = request.form.get('naam')
+                nummer = request.form.get('nummer')
+                if aantal > 1 and '{n}' not in (naam or '') + (nummer or ''):
+                    # Zonder patroon zouden alle ruimtes dezelfde naam krijgen.
+                    naam = f"{naam} {{n}}"
+                nieuwe_ruimtes = [
+                    Ruimte(bedrijf_id=bedrijf_id, vestiging_id=vest_id, naam=_ruimte_nummering(naam, n), nummer=_ruimte_nummering(nummer, n), ruimte_type_id=request.form.get('ruimte_type_id'), type_ruimte='KAMER')
+                    for n in range(start, start + aantal)
+                ]
+                db.session.add_all(nieuwe_ruimtes)
                 db.session.flush()
                 kopieer_id = request.form.get('kopieer_van_ruimte_id', type=int)
-                if kopieer_id:
-                    bron_ruimte = get_scoped_item(Ruimte, kopieer_id, bedrijf_id)
-                    if bron_ruimte:
-                        bron_kasten = db.session.query(Kast).filter_by(ruimte_id=kopieer_id, bedrijf_id=bedrijf_id).all()
-                    else:
-                        bron_kasten = []
-                    for bron_kast in bron_kasten:
-                        nieuwe_kast = Kast(bedrijf_id=bedrijf_id, ruimte_id=nieuwe_ruimte.ruimte_id, naam=bron_kast.naam, type_opslag=bron_kast.type_opslag)
-                        db.session.add(nieuwe_kast)
-                        db.session.flush()
-                        posities = db.session.query(Voorraad_Positie).filter_by(kast_id=bron_kast.kast_id, bedrijf_id=bedrijf_id).all()
-                        for pos in posities:
-                            nieuw_pos = Voorraad_Positie(bedrijf_id=bedrijf_id, kast_id=nieuwe_kast.kast_id, lokaal_artikel_id=pos.lokaal_artikel_id, strategie=pos.strategie, trigger_min=pos.trigger_min, target_max=pos.target_max, locatie_foto_url=pos.locatie_foto_url)
-                            db.session.add(nieuw_pos)
-                            db.session.flush()
-                            nieuw_pos.qr_code = f"{API_BASE_URL}/{nieuw_pos.voorraad_positie_id}"
+                if kopieer_id and get_scoped_item(Ruimte, kopieer_id, bedrijf_id):
+                    kloon_ruimte_inhoud(bedrijf_id, kopieer_id, [ruimte.ruimte_id for ruimte in nieuwe_ruimtes])
+                if aantal > 1:
+                    flash(f'{aantal} ruimtes aangemaakt.', 'success')
                 db.session.commit()
                 return redirect(url_for('beheer_infra', vestiging_id=vest_id))
             elif actie == 'nieuwe_kast':
@@ -1,13 +1,45 @@
 import datetime
+import fcntl
+import glob
+import json
+import logging
 import os
+import tempfile
+import threading
+import time
 import urllib.parse
+import uuid
+from collections import OrderedDict
 
 import azure.functions as func
 from sqlalchemy import create_engine, text
 
 
+MODULE_LOADED_AT = time.perf_counter()
 app = func.FunctionApp(http_auth_level=func.AuthLevel.ANONYMOUS)
 ENGINE = None
+ENGINE_LOCK = threading.Lock()
+FIRST_SCAN_LOGGED = False
+# Azure SQL verbreekt inactieve verbindingen; pre-ping en een recycle ruim
+# onder die grens voorkomen dat de eerste scan na stilte een dode verbinding krijgt.
+SCAN_DB_POOL_SIZE = max(1, int(os.environ.get('SCAN_DB_POOL_SIZE', '5')))
+SCAN_DB_MAX_OVERFLOW = max(0, int(os.environ.get('SCAN_DB_MAX_OVERFLOW', '5')))
+SCAN_DB_POOL_RECYCLE = int(os.environ.get('SCAN_DB_POOL_RECYCLE', '1200'))
+SCAN_DB_POOL_TIMEOUT = float(os.environ.get('SCAN_DB_POOL_TIMEOUT', '10'))
+SCAN_CARD_CACHE_TTL = float(os.environ.get('SCAN_CARD_CACHE_TTL', '300'))
+SCAN_CARD_NEGATIVE_TTL = float(os.environ.get('SCAN_CARD_NEGATIVE_TTL', '60'))
+SCAN_CARD_CACHE_MAX_ITEMS = max(1, int(os.environ.get('SCAN_CARD_CACHE_MAX_ITEMS', '5000')))
+SCAN_INGEST_MODE = os.environ.get('SCAN_INGEST_MODE', 'direct').strip().lower()
+SCAN_SPOOL_DIR = os.environ.get('SCAN_SPOOL_DIR', os.path.join(tempfile.gettempdir(), 'kanban-scan-spool'))
+SCAN_FLUSH_WINDOW_SECONDS = float(os.environ.get('SCAN_FLUSH_WINDOW_SECONDS', '2'))
+SCAN_FLUSH_MAX_LAG_SECONDS = float(os.environ.get('SCAN_FLUSH_MAX_LAG_SECONDS', '30'))
+CARD_CACHE = OrderedDict()
+CARD_CACHE_LOCK = threading.Lock()
+SPOOL_LOCK = threading.Lock()
+SPOOL_FLUSH_LOCK = threading.Lock()
+SPOOL_OLDEST_AT = None
+SPOOL_FLUSH_TIMER = None
+SPOOL_FLUSH_THREAD = None
 
 
 def _get_engine():
@@ -15,24 +47,486 @@ def _get_engine():
     if ENGINE is not None:
         return ENGINE
 
-    db_server = os.environ.get('DB_SERVER')
-    db_name = os.environ.get('DB_NAME')
-    db_user = os.environ.get('DB_USER')
-    db_pass = os.environ.get('DB_PASS')
-    if not all([db_server, db_name, db_user, db_pass]):
-        raise RuntimeError("Database configuratie ontbreekt.")
-
-    encoded_user = urllib.parse.quote_plus(db_user)
-    encoded_pass = urllib.parse.quote_plus(db_pass)
-    driver = 'ODBC+Driver+18+for+SQL+Server'
-    connection_string = (
-        f"mssql+pyodbc://{encoded_user}:{encoded_pass}@{db_server}/{db_name}"
-        f"?driver={driver}&TrustServerCertificate=yes"
-    )
-    ENGINE = create_engine(connection_string, future=True)
+    with ENGINE_LOCK:
+        if ENGINE is not None:
+            return ENGINE
+
+        db_server = os.environ.get('DB_SERVER')
+        db_name = os.environ.get('DB_NAME')
+        db_user = os.environ.get('DB_USER')
+        db_pass = os.environ.get('DB_PASS')
+        if not all([db_server, db_name, db_user, db_pass]):
+            raise RuntimeError("Database configuratie ontbreekt.")
+
+        started = time.perf_counter()
+        encoded_user = urllib.parse.quote_plus(db_user)
+        encoded_pass = urllib.parse.quote_plus(db_pass)
+        driver = 'ODBC+Driver+18+for+SQL+Server'
+        connection_string = (
+            f"mssql+pyodbc://{encoded_user}:{encoded_pass}@{db_server}/{db_name}"
+            f"?driver={driver}&TrustServerCertificate=yes"
+        )
+        ENGINE = create_engine(
+            connection_string,
+            future=True,
+            pool_pre_ping=True,
+            pool_recycle=SCAN_DB_POOL_RECYCLE,
+            pool_size=SCAN_DB_POOL_SIZE,
+            max_overflow=SCAN_DB_MAX_OVERFLOW,
+            pool_timeout=SCAN_DB_POOL_TIMEOUT
+        )
+        logging.info("Scan-engine aangemaakt in %.1f ms.", (time.perf_counter() - started) * 1000)
     return ENGINE
 
 
+def _warm_up(reason):
+    """Opent de pool en controleert de verbinding; geeft de duur in ms terug."""
+    started = time.perf_counter()
+    with _get_engine().connect() as conn:
+        conn.execute(text("SELECT 1"))
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    logging.info(
+        "Warm-up (%s): database klaar in %.1f ms, %.1f s na laden van de module.",
+        reason, elapsed_ms, time.perf_counter() - MODULE_LOADED_AT
+    )
+    return elapsed_ms
+
+
+@app.warm_up_trigger('warmup')
+def warmup(warmup) -> None:
+    _warm_up("warmup-trigger")
+
+
+# Geen run_on_startup: dat vuurt ook bij elke scale-out en redeploy, en nieuwe
+# instances worden al door de warmup-trigger opgewarmd.
+@app.timer_trigger(schedule="0 */5 * * * *", arg_name="timer", run_on_startup=False, use_monitor=False)
+def keep_warm(timer: func.TimerRequest) -> None:
+    try:
+        _warm_up("timer")
+    except Exception:
+        logging.exception("Warm-up mislukt.")
+
+
+@app.route(route="ready", methods=["GET"], auth_level=func.AuthLevel.ANONYMOUS)
+def ready(req: func.HttpRequest) -> func.HttpResponse:
+    try:
+        elapsed_ms = _warm_up("readiness")
+    except Exception:
+        # Anoniem endpoint: geen driver- of verbindingsdetails teruggeven.
+        logging.exception("Readiness-controle mislukt.")
+        return func.HttpResponse(
+            json.dumps({"ok": False, "error": "Database niet bereikbaar."}),
+            status_code=503,
+            mimetype="application/json"
+        )
+    return func.HttpResponse(
+        json.dumps({"ok": True, "dbMs": round(elapsed_ms, 1)}),
+        status_code=200,
+        mimetype="application/json"
+    )
+
+
+# Eén statement voor kaartcontrole en scan-registratie. HOLDLOCK serialiseert
+# gelijktijdige scans van dezelfde kaart; de unieke gefilterde index
+# UX_Kanban_Scanlijst_Item_open_kaart (aangemaakt door de webapp) garandeert
+# maximaal één open regel per kaart_id.
+SCAN_UPSERT_SQL = text("""
+    MERGE Kanban_Scanlijst_Item WITH (HOLDLOCK) AS target
+    USING (
+        SELECT kaart_id, bedrijf_id, human_code, product_name, location_text
+        FROM Kanban_Kaart
+        WHERE public_token = :public_token AND status = 'PRINTED'
+    ) AS source
+    ON target.kaart_id = source.kaart_id AND target.reset_at IS NULL
+    WHEN MATCHED THEN
+        UPDATE SET scan_count = target.scan_count + 1,
+                   last_scanned_at = :now
+    WHEN NOT MATCHED THEN
+        INSERT (kaart_id, bedrijf_id, first_scanned_at, last_scanned_at, scan_count, reset_at, reset_by)
+        VALUES (source.kaart_id, source.bedrijf_id, :now, :now, 1, NULL, NULL)
+    OUTPUT $action AS merge_action,
+           inserted.scan_count,
+           source.kaart_id,
+           source.bedrijf_id,
+           source.human_code,
+           source.product_name,
+           source.location_text;
+""")
+
+
+def _card_cache_get(public_token):
+    with CARD_CACHE_LOCK:
+        entry = CARD_CACHE.get(public_token)
+        if entry is None:
+            return None
+        if entry["expires_at"] <= time.monotonic():
+            del CARD_CACHE[public_token]
+            return None
+        CARD_CACHE.move_to_end(public_token)
+        return entry
+
+
+def _card_cache_put(public_token, card):
+    # Geprinte kaarten blijven SCAN_CARD_CACHE_TTL geldig; onbekende tokens en
+    # niet-actieve kaarten maar kort, zodat een nieuw geprinte kaart snel werkt.
+    # Positieve entries gebruikt alleen de spool-modus (_lookup_card): in
+    # direct-modus moet elke scan toch schrijven en controleert de MERGE de status.
+    active = card is not None and card.get("status") == "PRINTED"
+    ttl = SCAN_CARD_CACHE_TTL if active else SCAN_CARD_NEGATIVE_TTL
+    if ttl <= 0:
+        return
+    with CARD_CACHE_LOCK:
+        CARD_CACHE[public_token] = {"card": card, "expires_at": time.monotonic() + ttl}
+        CARD_CACHE.move_to_end(public_token)
+        while len(CARD_CACHE) > SCAN_CARD_CACHE_MAX_ITEMS:
+            CARD_CACHE.popitem(last=False)
+
+
+def _register_scan(public_token, now):
+    """Geeft (scan, kaart) terug; scan is None als de kaart onbekend of niet actief is.
+
+    Alleen de negatieve cache bespaart hier een round trip: een bekend onbekend
+    of inactief token wordt zonder database beantwoord. Een actieve kaart kost
+    altijd één MERGE, die de status zelf controleert.
+    """
+    cached = _card_cache_get(public_token)
+    if cached is not None and (cached["card"] is None or cached["card"]["status"] != "PRINTED"):
+        return None, cached["card"]
+
+    with _get_engine().begin() as conn:
+        scan = conn.execute(
+            SCAN_UPSERT_SQL,
+            {"public_token": public_token, "now": now}
+        ).mappings().first()
+        if scan:
+            card = {
+                "kaart_id": scan["kaart_id"],
+                "bedrijf_id": scan["bedrijf_id"],
+                "product_name": scan["product_name"],
+                "location_text": scan["location_text"],
+                "status": "PRINTED"
+            }
+            return scan, card
+
+        row = conn.execute(text("""
+            SELECT kaart_id, bedrijf_id, product_name, location_text, status
+            FROM Kanban_Kaart
+            WHERE public_token = :public_token
+        """), {"public_token": public_token}).mappings().first()
+
+    card = dict(row) if row else None
+    _card_cache_put(public_token, card)
+    return None, card
+
+
+def _lookup_card(public_token):
+    cached = _card_cache_get(public_token)
+    if cached is not None:
+        return cached["card"]
+    with _get_engine().connect() as conn:
+        row = conn.execute(text("""
+            SELECT kaart_id, bedrijf_id, product_name, location_text, status
+            FROM Kanban_Kaart
+            WHERE public_token = :public_token
+        """), {"public_token": public_token}).mappings().first()
+    card = dict(row) if row else None
+    _card_cache_put(public_token, card)
+    return card
+
+
+# --- WRITE-BEHIND SPOOL ---
+# In spool-modus wordt een scan alleen als regel aan een lokaal append-only
+# bestand toegevoegd (fsync) en direct beantwoord. Een flusher vouwt de regels
+# periodiek in één MERGE per batch samen in Kanban_Scanlijst_Item.
+
+SCAN_BATCH_MERGE_SQL = text("""
+    MERGE Kanban_Scanlijst_Item WITH (HOLDLOCK) AS target
+    USING (
+        SELECT batch.kaart_id, batch.bedrijf_id, batch.scans, batch.first_at, batch.last_at
+        FROM OPENJSON(:batch) WITH (
+            kaart_id NVARCHAR(36),
+            bedrijf_id INT,
+            scans INT,
+            first_at DATETIME2,
+            last_at DATETIME2
+        ) AS batch
+        JOIN Kanban_Kaart AS kaart ON kaart.kaart_id = batch.kaart_id AND kaart.status = 'PRINTED'
+    ) AS source
+    ON target.kaart_id = source.kaart_id AND target.reset_at IS NULL
+    WHEN MATCHED THEN
+        UPDATE SET scan_count = target.scan_count + source.scans,
+                   last_scanned_at = CASE
+                       WHEN source.last_at > target.last_scanned_at THEN source.last_at
+                       ELSE target.last_scanned_at
+                   END
+    WHEN NOT MATCHED THEN
+        INSERT (kaart_id, bedrijf_id, first_scanned_at, last_scanned_at, scan_count, reset_at, reset_by)
+        VALUES (source.kaart_id, source.bedrijf_id, source.first_at, source.last_at, source.scans, NULL, NULL)
+    OUTPUT source.kaart_id;
+""")
+
+# Het segment-id gaat in dezelfde transactie als de MERGE. Stopt het proces na
+# de commit maar voor het verwijderen van het bestand, dan slaat de volgende
+# flush het segment over in plaats van de scans nogmaals op te tellen.
+SCAN_SEGMENT_APPLIED_SQL = text("""
+    SELECT 1 FROM Kanban_Scan_Spool_Segment WITH (UPDLOCK, HOLDLOCK)
+    WHERE segment_id = :segment_id
+""")
+SCAN_SEGMENT_RECORD_SQL = text("""
+    INSERT INTO Kanban_Scan_Spool_Segment (segment_id, applied_at, scans)
+    VALUES (:segment_id, SYSUTCDATETIME(), :scans);
+    DELETE FROM Kanban_Scan_Spool_Segment WHERE applied_at < DATEADD(day, -7, SYSUTCDATETIME());
+""")
+
+
+def _active_spool_path():
+    return os.path.join(SCAN_SPOOL_DIR, f"active-{os.getpid()}.jsonl")
+
+
+def _spool_scan(card, now):
+    global SPOOL_OLDEST_AT
+    record = json.dumps({
+        "kaart_id": card["kaart_id"],
+        "bedrijf_id": card["bedrijf_id"],
+        "scanned_at": now.isoformat()
+    }) + "\n"
+    with SPOOL_LOCK:
+        os.makedirs(SCAN_SPOOL_DIR, exist_ok=True)
+        path = _active_spool_path()
+        while True:
+            with open(path, 'a', encoding='utf-8') as handle:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+                # Is het segment tussen open en lock afgesloten door een flusher,
+                # dan opnieuw openen zodat de scan niet in een verwerkt bestand belandt.
+                try:
+                    current = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if current.st_ino != os.fstat(handle.fileno()).st_ino:
+                    continue
+                handle.write(record)
+                handle.flush()
+                os.fsync(handle.fileno())
+                break
+        if SPOOL_OLDEST_AT is None:
+            SPOOL_OLDEST_AT = time.monotonic()
+        lag = time.monotonic() - SPOOL_OLDEST_AT
+
+    # Nooit op het requestpad flushen: de scan staat al veilig in de spool en een
+    # databasefout mag de gebruiker niet tot een dubbele scan verleiden.
+    if lag >= SCAN_FLUSH_MAX_LAG_SECONDS:
+        _start_background_flush()
+    else:
+        _arm_flush_timer()
+
+
+def _arm_flush_timer():
+    global SPOOL_FLUSH_TIMER
+    with SPOOL_LOCK:
+        if SPOOL_FLUSH_TIMER is not None:
+            return
+        SPOOL_FLUSH_TIMER = threading.Timer(SCAN_FLUSH_WINDOW_SECONDS, _flush_from_timer)
+        SPOOL_FLUSH_TIMER.daemon = True
+        SPOOL_FLUSH_TIMER.start()
+
+
+def _start_background_flush():
+    """Start direct een flush in een achtergrondthread, tenzij er al een loopt."""
+    global SPOOL_FLUSH_THREAD
+    with SPOOL_LOCK:
+        if SPOOL_FLUSH_THREAD is not None and SPOOL_FLUSH_THREAD.is_alive():
+            return
+        SPOOL_FLUSH_THREAD = threading.Thread(target=_flush_in_background, name="scan-spool-flush", daemon=True)
+        SPOOL_FLUSH_THREAD.start()
+
+
+def _flush_in_background():
+    try:
+        flush_scan_spool()
+    except Exception:
+        logging.exception("Scan-spool flush mislukt.")
+        # Database tijdelijk weg: later opnieuw proberen in plaats van wachten op de volgende scan.
+        _arm_flush_timer()
+
+
+def _flush_from_timer():
+    global SPOOL_FLUSH_TIMER
+    with SPOOL_LOCK:
+        SPOOL_FLUSH_TIMER = None
+    try:
+        flush_scan_spool()
+    except Exception:
+        logging.exception("Scan-spool flush mislukt.")
+
+
+def _seal_segment(path):
+    # Hernoemen is atomair; de flock wacht op een schrijver die nog bezig is
+    # met een append op de oude naam.
+    sealed_path = os.path.join(SCAN_SPOOL_DIR, f"ready-{os.getpid()}-{time.time_ns()}-{uuid.uuid4().hex[:8]}.jsonl")
+    try:
+        os.rename(path, sealed_path)
+    except FileNotFoundError:
+        return None
+    with open(sealed_path, 'a', encoding='utf-8') as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+    return sealed_path
+
+
+def _seal_spool_segments():
+    global SPOOL_OLDEST_AT
+    with SPOOL_LOCK:
+        own_path = _active_spool_path()
+        if os.path.exists(own_path):
+            _seal_segment(own_path)
+        SPOOL_OLDEST_AT = None
+
+    # Segmenten van andere (of gestopte) processen worden pas opgepakt als ze
+    # langer dan de maximale vertraging niet meer zijn bijgeschreven.
+    cutoff = time.time() - SCAN_FLUSH_MAX_LAG_SECONDS
+    for path in glob.glob(os.path.join(SCAN_SPOOL_DIR, "active-*.jsonl")):
+        try:
+            if os.path.getmtime(path) < cutoff:
+                _seal_segment(path)
+        except FileNotFoundError:
+            continue
+
+
+def _fold_segment(path):
+    folded = {}
+    with open(path, 'r', encoding='utf-8') as handle:
+        for line in handle:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            entry = folded.get(record["kaart_id"])
+            if entry is None:
+                folded[record["kaart_id"]] = {
+                    "kaart_id": record["kaart_id"],
+                    "bedrijf_id": record["bedrijf_id"],
+                    "scans": 1,
+                    "first_at": record["scanned_at"],
+                    "last_at": record["scanned_at"]
+                }
+            else:
+                entry["scans"] += 1
+                entry["first_at"] = min(entry["first_at"], record["scanned_at"])
+                entry["last_at"] = max(entry["last_at"], record["scanned_at"])
+    return folded
+
+
+def _apply_segment(conn, segment_id, folded):
+    """Voegt een segment samen in de scanlijst; geeft False als het al verwerkt was."""
+    if conn.execute(SCAN_SEGMENT_APPLIED_SQL, {"segment_id": segment_id}).first():
+        logging.warning("Scan-spool: segment %s was al verwerkt, opnieuw aangeboden na een onderbroken flush; overgeslagen.", segment_id)
+        return False
+    merged = {row.kaart_id for row in conn.execute(SCAN_BATCH_MERGE_SQL, {"batch": json.dumps(list(folded.values()))})}
+    dropped = [entry for kaart_id, entry in folded.items() if kaart_id not in merged]
+    if dropped:
+        logging.warning(
+            "Scan-spool: %s kaart(en) met %s scan(s) niet op de scanlijst gezet, kaart niet meer PRINTED: %s",
+            len(dropped), sum(entry["scans"] for entry in dropped),
+            ", ".join(entry["kaart_id"] for entry in dropped)
+        )
+    conn.execute(SCAN_SEGMENT_RECORD_SQL, {
+        "segment_id": segment_id,
+        "scans": sum(entry["scans"] for entry in folded.values())
+    })
+    return True
+
+
+def _try_lock(handle):
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
+
+
+def _recover_stale_segments():
+    # Een flusher houdt een flock op zijn flushing-* bestand; de kernel geeft die
+    # vrij als het proces stopt. Lukt de lock, dan is de flush afgebroken en gaat
+    # het segment terug naar ready-*. Werkt ook als een herstart dezelfde pid krijgt.
+    for path in glob.glob(os.path.join(SCAN_SPOOL_DIR, "flushing-*.jsonl")):
+        try:
+            handle = open(path, 'a', encoding='utf-8')
+        except FileNotFoundError:
+            continue
+        with handle:
+            if not _try_lock(handle):
+                continue
+            try:
+                os.rename(path, path.replace("flushing-", "ready-", 1))
+            except FileNotFoundError:
+                continue
+
+
+def flush_scan_spool():
+    """Verwerkt alle afgesloten spool-segmenten; geeft het aantal verwerkte scans terug."""
+    if not glob.glob(os.path.join(SCAN_SPOOL_DIR, "*.jsonl")):
+        return 0
+    with SPOOL_FLUSH_LOCK:
+        _recover_stale_segments()
+        _seal_spool_segments()
+        flushed = 0
+        for path in sorted(glob.glob(os.path.join(SCAN_SPOOL_DIR, "ready-*.jsonl"))):
+            try:
+                handle = open(path, 'a', encoding='utf-8')
+            except FileNotFoundError:
+                continue
+            with handle:
+                # Eerst locken, dan claimen: zo is een flushing-* bestand nooit
+                # zonder lock en kan _recover_stale_segments het niet afpakken.
+                if not _try_lock(handle):
+                    continue
+                claimed_path = path.replace("ready-", "flushing-", 1)
+                try:
+                    os.rename(path, claimed_path)
+                except FileNotFoundError:
+                    continue
+
+                segment_id = os.path.basename(path)[len("ready-"):-len(".jsonl")]
+                try:
+                    folded = _fold_segment(claimed_path)
+                    applied = False
+                    if folded:
+                        with _get_engine().begin() as conn:
+                            applied = _apply_segment(conn, segment_id, folded)
+                except Exception:
+                    os.rename(claimed_path, path)
+                    raise
+                os.remove(claimed_path)
+            if applied:
+                flushed += sum(entry["scans"] for entry in folded.values())
+
+    if flushed:
+        logging.info("Scan-spool: %s scan(s) verwerkt.", flushed)
+    return flushed
+
+
+# Let op: een timer trigger draait op één instance tegelijk, terwijl elke
+# instance een eigen spool in SCAN_SPOOL_DIR heeft. Deze trigger is dus alleen
+# een vangnet voor de instance waarop hij draait; spools op andere instances
+# worden geleegd door hun eigen flushtimer en door _drain_spool_on_startup().
+# In direct-modus wordt de trigger niet geregistreerd.
+if SCAN_INGEST_MODE == 'spool':
+    @app.timer_trigger(schedule="*/30 * * * * *", arg_name="timer", run_on_startup=False, use_monitor=False)
+    def scan_spool_flush(timer: func.TimerRequest) -> None:
+        flush_scan_spool()
+
+
+def _drain_spool_on_startup():
+    """Plant bij het laden een flush in voor segmenten die eerdere processen hebben achtergelaten."""
+    if SCAN_INGEST_MODE != 'spool':
+        return
+    # Afgebroken flushing-* segmenten worden in flush_scan_spool() zelf teruggezet.
+    if glob.glob(os.path.join(SCAN_SPOOL_DIR, "*.jsonl")):
+        _arm_flush_timer()
+
+
+_drain_spool_on_startup()
+
+
 def _html_page(title, body, status_code=200):
     html = f"""<!doctype html>
 <html lang="nl">
@@ -57,74 +551,76 @@ def _html_page(title, body, status_code=200):
     return func.HttpResponse(html, status_code=status_code, mimetype="text/html")
 
 
+def _log_scan_latency(started):
+    global FIRST_SCAN_LOGGED
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if not FIRST_SCAN_LOGGED:
+        FIRST_SCAN_LOGGED = True
+        logging.info(
+            "Eerste scan na start verwerkt in %.1f ms (%.1f s na laden van de module).",
+            elapsed_ms, time.perf_counter() - MODULE_LOADED_AT
+        )
+    else:
+        logging.debug("Scan verwerkt in %.1f ms.", elapsed_ms)
+
+
 @app.route(route="scan/{public_token}", methods=["GET"], auth_level=func.AuthLevel.ANONYMOUS)
 def scan_card(req: func.HttpRequest) -> func.HttpResponse:
     public_token = req.route_params.get("public_token")
     if not public_token:
         return _html_page("Ongeldige scan", '<div class="card"><h1>Ongeldige scan</h1><p>De QR-code bevat geen geldig token.</p></div>', 400)
 
+    started = time.perf_counter()
     try:
-        engine = _get_engine()
         now = datetime.datetime.utcnow()
-        with engine.begin() as conn:
-            card = conn.execute(text("""
-                SELECT kaart_id, bedrijf_id, human_code, product_name, location_text, status
-                FROM Kanban_Kaart
-                WHERE public_token = :public_token
-            """), {"public_token": public_token}).mappings().first()
+        if SCAN_INGEST_MODE == 'spool':
+            card = _lookup_card(public_token)
+            if card and card["status"] == "PRINTED":
+                _spool_scan(card, now)
+                body = f"""
+        <div class="card">
+          <span class="badge">Scan ontvangen</span>
+          <h1>{card["product_name"]}</h1>
+          <p class="muted">{card["location_text"]}</p>
+          <p>Dit kaartje wordt op de scanlijst gezet.</p>
+        </div>
+        """
+                _log_scan_latency(started)
+                return _html_page("Scan ontvangen", body, 200)
+            scan = None
+        else:
+            scan, card = _register_scan(public_token, now)
 
+        if not scan:
             if not card:
                 return _html_page(
                     "Kaart niet gevonden",
                     '<div class="card"><h1>Kaart niet gevonden</h1><p>Deze QR-code is onbekend.</p></div>',
                     404
                 )
+            return _html_page(
+                "Kaart niet actief",
+                '<div class="card"><h1>Kaart niet actief</h1><p>Dit kaartje is nog niet geprint of is geannuleerd.</p></div>',
+                409
+            )
 
-            if card["status"] != "PRINTED":
-                return _html_page(
-                    "Kaart niet actief",
-                    '<div class="card"><h1>Kaart niet actief</h1><p>Dit kaartje is nog niet geprint of is geannuleerd.</p></div>',
-                    409
-                )
-
-            existing = conn.execute(text("""
-                SELECT TOP 1 scanlijst_item_id, scan_count
-                FROM Kanban_Scanlijst_Item
-                WHERE kaart_id = :kaart_id AND reset_at IS NULL
-                ORDER BY last_scanned_at DESC
-            """), {"kaart_id": card["kaart_id"]}).mappings().first()
-
-            if existing:
-                conn.execute(text("""
-                    UPDATE Kanban_Scanlijst_Item
-                    SET scan_count = scan_count + 1,
-                        last_scanned_at = :now
-                    WHERE scanlijst_item_id = :scanlijst_item_id
-                """), {"now": now, "scanlijst_item_id": existing["scanlijst_item_id"]})
-                message = "Dit kaartje stond al op de scanlijst en is opnieuw bevestigd."
-                count = int(existing["scan_count"]) + 1
-            else:
-                conn.execute(text("""
-                    INSERT INTO Kanban_Scanlijst_Item (
-                        kaart_id, bedrijf_id, first_scanned_at, last_scanned_at, scan_count, reset_at, reset_by
-                    )
-                    VALUES (
-                        :kaart_id, :bedrijf_id, :now, :now, 1, NULL, NULL
-                    )
-                """), {"kaart_id": card["kaart_id"], "bedrijf_id": card["bedrijf_id"], "now": now})
-                message = "Dit kaartje is toegevoegd aan de scanlijst."
-                count = 1
+        count = int(scan["scan_count"])
+        if scan["merge_action"] == "UPDATE":
+            message = "Dit kaartje stond al op de scanlijst en is opnieuw bevestigd."
+        else:
+            message = "Dit kaartje is toegevoegd aan de scanlijst."
 
         body = f"""
         <div class="card">
           <span class="badge">Scan verwerkt</span>
-          <h1>{card["product_name"]}</h1>
-          <p class="muted">{card["location_text"]}</p>
-          <p><strong>Kaartcode:</strong> {card["human_code"]}</p>
+          <h1>{scan["product_name"]}</h1>
+          <p class="muted">{scan["location_text"]}</p>
+          <p><strong>Kaartcode:</strong> {scan["human_code"]}</p>
           <p>{message}</p>
           <p class="muted">Aantal scans sinds laatste reset: {count}</p>
         </div>
         """
+        _log_scan_latency(started)
         return _html_page("Scan verwerkt", body, 200)
     except Exception as exc:
         return _html_page(
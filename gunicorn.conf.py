@@ -0,0 +1,31 @@
+# Gunicorn-configuratie voor de webapp (wordt automatisch geladen vanuit de werkmap).
+#
+# De app wordt in de master geladen en het schema daar één keer gereflecteerd;
+# workers erven de modellen copy-on-write. Verbindingen en HTTP-sessies worden
+# na de fork opnieuw opgebouwd (zie _reset_after_fork in app.py).
+#
+# Workers, threads en timeout blijven standaard gelijk aan de eerdere start
+# (App Service: `gunicorn --timeout 600 app:app`, dus 1 worker met 1 thread).
+# Meer workers/threads alleen via GUNICORN_WORKERS / GUNICORN_THREADS.
+import gc
+import os
+
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', '8000')}")
+wsgi_app = 'app:create_app()'
+preload_app = True
+workers = int(os.environ.get('GUNICORN_WORKERS', '1'))
+threads = int(os.environ.get('GUNICORN_THREADS', '1'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '600'))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', '0'))
+
+
+def when_ready(server):
+    # Ook bij een startcommando met `app:app` de reflectie in de master doen.
+    import app as kanban_app
+    kanban_app.init_database()
+    # Objecten uit de master buiten de GC houden, zodat workers die pagina's
+    # niet aanraken en het geheugen gedeeld blijft.
+    gc.freeze()
+    server.log.info("Database geïnitialiseerd in master (pid %s), %s workers", os.getpid(), server.num_workers)
@@ -94,6 +94,12 @@ echo "  DB_NAME"
 echo "  DB_USER"
 echo "  DB_PASS"
 echo
+echo "Optional scan ingestion settings (defaults in function_app.py):"
+echo "  SCAN_INGEST_MODE=direct|spool"
+echo "  SCAN_SPOOL_DIR, SCAN_FLUSH_WINDOW_SECONDS, SCAN_FLUSH_MAX_LAG_SECONDS"
+echo "  SCAN_DB_POOL_SIZE, SCAN_DB_MAX_OVERFLOW, SCAN_DB_POOL_RECYCLE, SCAN_DB_POOL_TIMEOUT"
+echo "Readiness probe: https://$FUNCTION_URL/ready"
+echo
 echo "Set this app setting on the web app:"
 echo "  KANBAN_SCAN_BASE_URL=https://$FUNCTION_URL"
 
@@ -0,0 +1,140 @@
+"""Gedeelde fixtures: een SQLite-database in plaats van Azure SQL en een nep-printservice."""
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault('SECRET_KEY', 'test-secret-key-voor-kanban-tests-0123456789')
+
+import pytest
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.ext.automap import automap_base
+
+import app as kanban
+
+
+@pytest.fixture
+def sqlite_db(tmp_path, monkeypatch):
+    """Geeft maak(schema_sql, *tabellen): een SQLite-database met automap-modellen in app.
+
+    Alle vervangen globals en de app-config worden na de test hersteld.
+    """
+    def maak(schema_sql, *tabellen):
+        monkeypatch.setitem(kanban.app.config, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'kanban.db'}")
+        monkeypatch.delitem(kanban.app.extensions, 'sqlalchemy', raising=False)
+        monkeypatch.setattr(kanban, 'db', SQLAlchemy(kanban.app))
+        with kanban.app.app_context():
+            raw = kanban.db.engine.raw_connection()
+            raw.executescript(schema_sql)
+            raw.commit()
+            raw.close()
+            base = automap_base()
+            base.prepare(autoload_with=kanban.db.engine)
+            for naam in tabellen:
+                monkeypatch.setattr(kanban, naam, getattr(base.classes, naam))
+        return kanban.db
+
+    yield maak
+    if 'sqlalchemy' in kanban.app.extensions:
+        with kanban.app.app_context():
+            kanban.db.session.remove()
+            kanban.db.engine.dispose()
+
+
+# --- NEP-PRINTSERVICE ---
+# Zelfde endpoints als de printstation-service. Per test in te stellen:
+# batch (batchEndpoint adverteren), batch_status, batch_body (ruwe bytes in
+# plaats van een resultatenlijst) en card_ok (uitkomst per kaartje, op volgorde).
+
+REQUEST_FORMAT_PATH = '/api/v1/request-format'
+PRINT_CARD_PATH = '/api/v1/print-card'
+PRINT_CARDS_PATH = '/api/v1/print-cards'
+
+
+class FakePrintService(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakePrintHandler)
+        self.batch = True
+        self.max_batch_size = 25
+        self.batch_status = 200
+        self.batch_body = None
+        self.card_ok = []
+        self.lock = threading.Lock()
+        self.requests = {PRINT_CARD_PATH: 0, PRINT_CARDS_PATH: 0}
+        self.printed = 0
+
+    def next_card_ok(self):
+        with self.lock:
+            ok = self.card_ok.pop(0) if self.card_ok else True
+            self.printed += ok
+            return ok
+
+
+class FakePrintHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send(self, status, data, content_type='application/json'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_json(self, status, body):
+        self._send(status, json.dumps(body).encode('utf-8'))
+
+    def do_GET(self):
+        service = self.server
+        if self.path == REQUEST_FORMAT_PATH:
+            body = {}
+            if service.batch:
+                body = {"batchEndpoint": PRINT_CARDS_PATH, "maxBatchSize": service.max_batch_size}
+            self._send_json(200, body)
+        else:
+            self._send_json(404, {"error": "onbekend endpoint"})
+
+    def do_POST(self):
+        service = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        with service.lock:
+            service.requests[self.path] = service.requests.get(self.path, 0) + 1
+        if self.path == PRINT_CARD_PATH:
+            if service.next_card_ok():
+                self._send_json(200, {"ok": True})
+            else:
+                self._send_json(500, {"ok": False, "error": "printer storing"})
+        elif self.path == PRINT_CARDS_PATH:
+            if service.batch_status != 200:
+                self._send_json(service.batch_status, {"error": "niet ondersteund"})
+            elif service.batch_body is not None:
+                self._send(200, service.batch_body, 'text/html')
+            else:
+                results = []
+                for index, _ in enumerate(body.get('cards') or []):
+                    ok = service.next_card_ok()
+                    results.append({"index": index, "ok": ok, "error": None if ok else "printer storing"})
+                self._send_json(200, {"results": results})
+        else:
+            self._send_json(404, {"error": "onbekend endpoint"})
+
+
+@pytest.fixture
+def print_service(monkeypatch):
+    service = FakePrintService()
+    thread = threading.Thread(target=service.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(kanban, 'PRINT_SERVICE_URL', f"http://127.0.0.1:{service.server_port}{PRINT_CARD_PATH}")
+    monkeypatch.setattr(kanban, 'PRINT_SERVICE_REQUIRE_API_KEY', False)
+    monkeypatch.setattr(kanban, 'PRINT_SERVICE_API_KEY', None)
+    monkeypatch.setattr(kanban, 'PRINT_BATCH_MODE', 'auto')
+    monkeypatch.setattr(kanban, 'PRINT_BATCH_SIZE', 10)
+    monkeypatch.setattr(kanban, 'PRINT_REQUEST_FORMAT_CACHE', None)
+    monkeypatch.setattr(kanban, 'PRINT_HEALTH_CACHE', None)
+    yield service
+    service.shutdown()
+    service.server_close()
@@ -0,0 +1,91 @@
+"""Ruimte klonen: posities moeten in de overeenkomstige nieuwe kast belanden."""
+import pytest
+
+import app as kanban
+
+
+SCHEMA = """
+CREATE TABLE Ruimte(ruimte_id INTEGER NOT NULL PRIMARY KEY, bedrijf_id INTEGER, vestiging_id INTEGER, nummer TEXT, naam TEXT);
+CREATE TABLE Kast(kast_id INTEGER NOT NULL PRIMARY KEY, bedrijf_id INTEGER, ruimte_id INTEGER, naam TEXT, type_opslag TEXT);
+CREATE TABLE Voorraad_Positie(voorraad_positie_id INTEGER NOT NULL PRIMARY KEY, bedrijf_id INTEGER, kast_id INTEGER, lokaal_artikel_id INTEGER, trigger_min INTEGER, target_max INTEGER, strategie TEXT, locatie_foto_url TEXT, qr_code TEXT);
+"""
+
+# Sjabloonruimte 1 met drie kasten; twee hebben dezelfde naam zodat koppelen op naam niet zou werken.
+# Kast 7 hoort bij een ander bedrijf en mag niet mee.
+SEED = """
+INSERT INTO Ruimte VALUES (1, 1, 1, '101', 'Sjabloon'), (2, 1, 1, '102', 'Nieuw A'), (3, 1, 1, '103', 'Nieuw B');
+INSERT INTO Kast VALUES (5, 1, 1, 'Wand', 'KAST'), (6, 1, 1, 'Wand', 'KAR'), (7, 2, 1, 'Vreemd', 'KAST'), (9, 1, 1, 'Lade', 'LADE');
+INSERT INTO Voorraad_Positie VALUES
+    (1, 1, 5, 100, 1, 2, 'TWO_BIN', NULL, 'x'),
+    (2, 1, 6, 200, 3, 4, 'TWO_BIN', NULL, 'x'),
+    (3, 1, 6, 201, 5, 6, 'TWO_BIN', NULL, 'x'),
+    (4, 1, 9, 300, 7, 8, 'TWO_BIN', NULL, 'x'),
+    (5, 2, 7, 999, 1, 1, 'TWO_BIN', NULL, 'x');
+"""
+
+# Laat SQLite de sjabloonkasten via deze index lezen (LADE, KAST, KAR), zodat de
+# nieuwe kast_ids niet in de kast_id-volgorde van het sjabloon worden uitgedeeld.
+ANDERE_VOLGORDE = "CREATE INDEX IX_Kast_ruimte_type ON Kast (ruimte_id, type_opslag DESC);"
+
+VERWACHT = sorted([
+    ('Wand', 'KAST', [(100, 1, 2)]),
+    ('Wand', 'KAR', [(200, 3, 4), (201, 5, 6)]),
+    ('Lade', 'LADE', [(300, 7, 8)]),
+])
+
+
+@pytest.fixture
+def db_session(sqlite_db):
+    sqlite_db(SCHEMA + SEED, 'Ruimte', 'Kast', 'Voorraad_Positie')
+    with kanban.app.app_context():
+        yield kanban.db.session
+
+
+@pytest.fixture
+def db_session_andere_volgorde(sqlite_db):
+    sqlite_db(SCHEMA + SEED + ANDERE_VOLGORDE, 'Ruimte', 'Kast', 'Voorraad_Positie')
+    with kanban.app.app_context():
+        yield kanban.db.session
+
+
+def _inhoud_per_kast(session, ruimte_id):
+    Kast, Voorraad_Positie = kanban.Kast, kanban.Voorraad_Positie
+    kasten = session.query(Kast).filter(Kast.ruimte_id == ruimte_id).all()
+    return sorted(
+        (kast.naam, kast.type_opslag, sorted(
+            (pos.lokaal_artikel_id, pos.trigger_min, pos.target_max)
+            for pos in session.query(Voorraad_Positie).filter(Voorraad_Positie.kast_id == kast.kast_id)
+        ))
+        for kast in kasten
+    )
+
+
+def test_kloon_kopieert_posities_naar_de_juiste_kast(db_session):
+    kasten, posities = kanban.kloon_ruimte_inhoud(1, 1, [2, 3])
+    db_session.commit()
+
+    assert (kasten, posities) == (6, 8)
+    assert _inhoud_per_kast(db_session, 2) == VERWACHT
+    assert _inhoud_per_kast(db_session, 3) == VERWACHT
+
+
+def test_kloon_koppelt_ook_bij_andere_identity_volgorde(db_session_andere_volgorde):
+    session = db_session_andere_volgorde
+    kanban.kloon_ruimte_inhoud(1, 1, [2, 3])
+    session.commit()
+
+    Kast = kanban.Kast
+    nieuwe_types = [kast.type_opslag for kast in session.query(Kast).filter(Kast.ruimte_id == 2).order_by(Kast.kast_id)]
+    assert nieuwe_types != ['KAST', 'KAR', 'LADE']
+    assert _inhoud_per_kast(session, 2) == VERWACHT
+    assert _inhoud_per_kast(session, 3) == VERWACHT
+
+
+def test_kloon_vult_qr_code_met_nieuw_positie_id(db_session):
+    kanban.kloon_ruimte_inhoud(1, 1, [2])
+    db_session.commit()
+
+    Voorraad_Positie = kanban.Voorraad_Positie
+    nieuw = db_session.query(Voorraad_Positie).filter(Voorraad_Positie.voorraad_positie_id > 5).all()
+    assert nieuw
+    assert all(pos.qr_code == f"{kanban.API_BASE_URL}/{pos.voorraad_positie_id}" for pos in nieuw)
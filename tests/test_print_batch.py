@@ -0,0 +1,70 @@
+"""Gebundeld printen: per-kaartje resultaten, onleesbare antwoorden en terugval op losse verzending."""
+import pytest
+
+import app as kanban
+
+
+PRINT_CARD = '/api/v1/print-card'
+PRINT_CARDS = '/api/v1/print-cards'
+PIXEL = "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=="
+
+SCHEMA = """
+CREATE TABLE Print_Queue(print_id INTEGER NOT NULL PRIMARY KEY, bedrijf_id INTEGER, status TEXT, printer_id TEXT, card_type TEXT, header_text TEXT, header_color TEXT, product_name TEXT, product_packaging TEXT, product_sku TEXT, product_image_url TEXT, location_text TEXT, min_level INTEGER, max_level INTEGER, qr_code_value TEXT, qr_human_readable TEXT, company_logo_url TEXT, kaart_id TEXT, claimed_at TEXT, payload_json TEXT, payload_hash TEXT, aangemaakt_op TEXT);
+"""
+
+
+@pytest.fixture
+def wachtrij(sqlite_db):
+    sqlite_db(SCHEMA, 'Print_Queue')
+    with kanban.app.app_context():
+        for print_id in (1, 2, 3):
+            kanban.db.session.add(kanban.Print_Queue(
+                print_id=print_id, bedrijf_id=1, status='SENDING', printer_id='reception-badgy-01',
+                card_type='KANBAN_TWO_BIN', header_text='101 KAMER', header_color='#3B82F6',
+                product_name=f'Artikel {print_id}', product_packaging='Stuk', product_sku=str(print_id),
+                product_image_url=PIXEL, location_text='Kast A (KAST)', min_level=1, max_level=2,
+                qr_code_value=f'https://example.invalid/scan/{print_id}', qr_human_readable=f'KB-{print_id}',
+                company_logo_url=PIXEL
+            ))
+        kanban.db.session.commit()
+        yield
+        kanban.db.session.rollback()
+
+
+def _verstuur():
+    items = kanban.db.session.query(kanban.Print_Queue).order_by(kanban.Print_Queue.print_id).all()
+    return {result["print_id"]: result["ok"] for result in kanban.dispatch_queue_items(items)}
+
+
+def _in_wachtrij():
+    return [print_id for (print_id,) in kanban.db.session.query(kanban.Print_Queue.print_id).order_by(kanban.Print_Queue.print_id)]
+
+
+def test_batch_alles_geprint(wachtrij, print_service):
+    assert _verstuur() == {1: True, 2: True, 3: True}
+    assert print_service.requests == {PRINT_CARDS: 1, PRINT_CARD: 0}
+    assert _in_wachtrij() == []
+
+
+def test_batch_gemengde_resultaten(wachtrij, print_service):
+    print_service.card_ok = [True, False, True]
+
+    assert _verstuur() == {1: True, 2: False, 3: True}
+    assert _in_wachtrij() == [2]
+
+
+def test_batch_onleesbaar_antwoord_laat_kaartjes_in_wachtrij(wachtrij, print_service):
+    print_service.batch_body = b'<html>OK</html>'
+
+    assert _verstuur() == {1: False, 2: False, 3: False}
+    assert _in_wachtrij() == [1, 2, 3]
+    assert print_service.requests[PRINT_CARD] == 0
+
+
+def test_batch_endpoint_404_valt_terug_op_losse_kaartjes(wachtrij, print_service):
+    print_service.batch_status = 404
+
+    assert _verstuur() == {1: True, 2: True, 3: True}
+    assert print_service.requests == {PRINT_CARDS: 1, PRINT_CARD: 3}
+    assert _in_wachtrij() == []
+    assert kanban._print_batch_settings() == (None, 1)